@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import cache, metrics, sqlite
+        from .backends import pool
+
+        metrics.collectors.append(cache.prometheus_lines)
+        metrics.collectors.append(pool.prometheus_lines)
+        metrics.collectors.append(sqlite.prometheus_lines)
+        connection_created.connect(sqlite.configure_connection)
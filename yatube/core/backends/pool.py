@@ -0,0 +1,210 @@
+"""Пул соединений с базой на процесс.
+
+Django 2.2 держит по соединению на поток и закрывает его по
+CONN_MAX_AGE. В многопоточном сервере поток живёт один запрос, так что
+соединение всё равно открывается заново. PooledDatabaseWrapperMixin
+вместо закрытия возвращает соединение в общий пул процесса, а новое
+берёт из пула. Пул ограничен: соединений не больше POOL['SIZE'], поток
+ждёт свободного до POOL['TIMEOUT'] секунд. Соединение из пула перед
+выдачей проверяется запросом SELECT 1 и закрывается, если прожило
+дольше CONN_MAX_AGE.
+"""
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.db import DatabaseError
+
+from .. import metrics
+
+DEFAULTS = {'SIZE': 8, 'TIMEOUT': 10}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(DatabaseError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, alias, size, timeout, max_age):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.pid = os.getpid()
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.born = {}
+        self.in_use = 0
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def expired(self, raw):
+        if self.max_age is None:
+            return False
+        born = self.born.get(id(raw))
+        return born is None or time.monotonic() - born >= self.max_age
+
+    def acquire(self, connect, healthy):
+        """Выдаёт соединение и признак того, что оно взято из пула."""
+        started = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'{self.alias}: нет свободного соединения '
+                f'за {self.timeout} с'
+            )
+        sample = metrics.current()
+        if sample is not None:
+            sample.pool_wait += time.perf_counter() - started
+        try:
+            raw = self._take_idle(healthy)
+            reused = raw is not None
+            if raw is None:
+                raw = connect()
+                with self.lock:
+                    self.born[id(raw)] = time.monotonic()
+                    self.opened += 1
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.in_use += 1
+            self.reused += reused
+        return raw, reused
+
+    def _take_idle(self, healthy):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                raw = self.idle.pop()
+            if not self.expired(raw) and healthy(raw):
+                return raw
+            self._drop(raw)
+
+    def release(self, raw, reusable=True):
+        with self.lock:
+            self.in_use -= 1
+        if reusable and not self.expired(raw):
+            with self.lock:
+                self.idle.append(raw)
+        else:
+            self._drop(raw)
+        self.slots.release()
+
+    def _drop(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.born.pop(id(raw), None)
+            self.discarded += 1
+
+    def clear(self):
+        """Закрывает простаивающие соединения."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for raw in idle:
+            self._drop(raw)
+
+
+def get_pool(alias, settings_dict):
+    """Пул для базы; после fork создаётся новый.
+
+    Ключ включает имя базы: тесты подменяют его у того же псевдонима.
+    """
+    key = (alias, settings_dict['NAME'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                options['SIZE'],
+                options['TIMEOUT'],
+                settings_dict['CONN_MAX_AGE'],
+            )
+        return pool
+
+
+def check_connection(raw):
+    try:
+        cursor = raw.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class PooledDatabaseWrapperMixin:
+    """Берёт соединения из пула и возвращает их туда вместо закрытия."""
+
+    pool = None
+    pool_reused = False
+
+    def pool_enabled(self):
+        return True
+
+    def get_new_connection(self, conn_params):
+        self.pool, self.pool_reused = None, False
+        if not self.pool_enabled():
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(self.alias, self.settings_dict)
+        connect = partial(super().get_new_connection, conn_params)
+        raw, self.pool_reused = self.pool.acquire(connect, check_connection)
+        return raw
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        reusable = not self.in_atomic_block and (
+            not self.errors_occurred or self.is_usable()
+        )
+        if reusable:
+            try:
+                self.connection.rollback()
+            except Exception:
+                reusable = False
+        pool, self.pool = self.pool, None
+        pool.release(self.connection, reusable)
+
+    def close_if_unusable_or_obsolete(self):
+        # Соединение живёт в пуле, а не в потоке: после запроса оно
+        # всегда возвращается туда, CONN_MAX_AGE проверяет сам пул.
+        if self.pool is None:
+            return super().close_if_unusable_or_obsolete()
+        if self.connection is not None and not self.in_atomic_block:
+            self.close()
+
+
+def prometheus_lines():
+    with _pools_lock:
+        pools = sorted(
+            ((alias, pool) for (alias, _), pool in _pools.items()),
+            key=lambda item: item[0],
+        )
+    name = 'yatube_db_pool_connections'
+    yield f'# HELP {name} Соединения в пуле по состоянию'
+    yield f'# TYPE {name} gauge'
+    for alias, pool in pools:
+        yield f'{name}{{alias="{alias}",state="in_use"}} {pool.in_use}'
+        yield f'{name}{{alias="{alias}",state="idle"}} {len(pool.idle)}'
+    counters = (
+        ('opened', 'Открыто новых соединений'),
+        ('reused', 'Выдано соединений из пула'),
+        ('discarded', 'Закрыто устаревших и неисправных соединений'),
+    )
+    for field, help_text in counters:
+        name = f'yatube_db_pool_{field}_total'
+        yield f'# HELP {name} {help_text}'
+        yield f'# TYPE {name} counter'
+        for alias, pool in pools:
+            yield f'{name}{{alias="{alias}"}} {getattr(pool, field)}'
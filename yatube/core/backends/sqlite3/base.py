@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pool_enabled(self):
+        # База в памяти живёт, пока открыто её соединение.
+        return not self.is_in_memory_db()
@@ -0,0 +1,305 @@
+"""Кэш, общий для всех процессов на одном сервере.
+
+LocMemCache держит отдельную копию в каждом воркере, поэтому
+инвалидация из одного процесса не видна остальным. Здесь собраны
+бэкенды, которые выбираются в settings.CACHES:
+
+* SQLiteCache — кэш в файле SQLite с вытеснением давно не читавшихся
+  ключей (LRU) при превышении MAX_ENTRIES и атомарным incr;
+* FileBasedCache, MemcachedCache и LocMemCache — встроенные бэкенды
+  Django с теми же счётчиками попаданий.
+
+Все бэкенды считают попадания и промахи по префиксу ключа
+(часть до первого `:`, `.` или `|`), см. cache_stats().
+"""
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache.backends import filebased, locmem, memcached
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+_stats = defaultdict(lambda: [0, 0])
+_stats_lock = threading.Lock()
+_MISSING = object()
+
+
+def key_prefix(key):
+    return re.split(r'[:.|]', key, maxsplit=1)[0]
+
+
+def cache_stats():
+    """Возвращает {префикс: (попадания, промахи)} с запуска процесса."""
+    with _stats_lock:
+        return {prefix: tuple(counters) for prefix, counters in _stats.items()}
+
+
+def prometheus_lines():
+    name = 'yatube_cache_prefix_requests_total'
+    yield f'# HELP {name} Обращения к кэшу по префиксам ключей'
+    yield f'# TYPE {name} counter'
+    for prefix, (hits, misses) in sorted(cache_stats().items()):
+        yield f'{name}{{prefix="{prefix}",result="hit"}} {hits}'
+        yield f'{name}{{prefix="{prefix}",result="miss"}} {misses}'
+
+
+class CacheStatsMixin:
+    """Считает попадания и промахи get/get_many по префиксам ключей."""
+
+    def _record(self, key, hit):
+        with _stats_lock:
+            _stats[key_prefix(key)][0 if hit else 1] += 1
+        metrics.record_cache(hit)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        self._record(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        found = super().get_many(keys, version)
+        for key in keys:
+            self._record(key, key in found)
+        return found
+
+
+class LocMemCache(CacheStatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(CacheStatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class MemcachedCache(CacheStatsMixin, memcached.MemcachedCache):
+    pass
+
+
+class SQLiteStore(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов сервера.
+
+    Значения хранятся в pickle, целые числа — как есть, чтобы incr
+    выполнялся одним атомарным UPDATE. При превышении MAX_ENTRIES
+    удаляются истёкшие ключи, а затем давно не читавшиеся.
+
+    Чтобы чтение не превращалось в запись, отметка о чтении обновляется
+    не чаще раза в ACCESS_RESOLUTION секунд, а число ключей проверяется
+    раз в CULL_EVERY записанных ключей (оба параметра — из OPTIONS).
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 60)
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, '
+                'expires REAL, accessed REAL)'
+            )
+            db.execute(
+                'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)'
+            )
+            self._local.db = db
+        return db
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _live(self):
+        return '(expires IS NULL OR expires > ?)'
+
+    def get(self, key, default=None, version=None):
+        return self._fetch([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        return self._fetch(keys, version)
+
+    def _fetch(self, keys, version):
+        if not keys:
+            return {}
+        made = {self.make_key(key, version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        now = time.time()
+        marks = ', '.join('?' * len(made))
+        rows = self._db.execute(
+            f'SELECT key, value, accessed FROM cache WHERE key IN ({marks}) '
+            f'AND {self._live()}',
+            (*made, now),
+        ).fetchall()
+        # Отметка о чтении — по ней вытесняются давно не нужные ключи.
+        stale = [
+            key
+            for key, _, accessed in rows
+            if accessed <= now - self._access_resolution
+        ]
+        if stale:
+            self._db.execute(
+                'UPDATE cache SET accessed = ? WHERE key IN (%s)'
+                % ', '.join('?' * len(stale)),
+                (now, *stale),
+            )
+        return {made[key]: self._decode(value) for key, value, _ in rows}
+
+    def _write(self, db, data, timeout, replace=True):
+        now = time.time()
+        expires = self._expires(timeout)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        written = 0
+        for key, value in data.items():
+            cursor = db.execute(
+                f'{verb} INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (key, self._encode(value), expires, now),
+            )
+            written += cursor.rowcount
+        self._local.writes = getattr(self._local, 'writes', 0) + len(data)
+        if self._local.writes >= self._cull_every:
+            self._local.writes = 0
+            self._cull(db, now)
+        return written
+
+    def _cull(self, db, now):
+        (total,) = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if total <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        (total,) = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        excess = total - self._max_entries
+        if excess > 0:
+            # Удаляем с запасом, чтобы не чистить на каждой записи.
+            excess += self._max_entries // self._cull_frequency
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,),
+            )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        made = {}
+        for key, value in data.items():
+            key = self.make_key(key, version)
+            self.validate_key(key)
+            made[key] = value
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            self._write(db, made, timeout)
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            return self._write(db, {key: value}, timeout, replace=False) > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        cursor = self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {self._live()}',
+            (self._expires(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        made = self.make_key(key, version)
+        self.validate_key(made)
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            cursor = db.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                f"WHERE key = ? AND typeof(value) = 'integer' "
+                f'AND {self._live()}',
+                (delta, time.time(), made, time.time()),
+            )
+            if cursor.rowcount:
+                (value,) = db.execute(
+                    'SELECT value FROM cache WHERE key = ?', (made,)
+                ).fetchone()
+                return value
+        # Не целое значение: как в BaseCache, через get/set.
+        value = self.get(key, _MISSING, version)
+        if value is _MISSING:
+            raise ValueError(f"Key '{key}' not found")
+        value += delta
+        self.set(key, value, version=version)
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        row = self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {self._live()}',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        if made:
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(made)),
+                made,
+            )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке и переиспользуется между запросами.
+        pass
+
+
+class SQLiteCache(CacheStatsMixin, SQLiteStore):
+    pass
@@ -0,0 +1,55 @@
+"""Дырки в закэшированных страницах.
+
+Страница для вошедшего пользователя отличается от общей только
+несколькими кусками: шапкой с его именем, кнопкой подписки, формой
+комментария. Такие куски в шаблоне размечаются тегом {% hole %}. При
+обычной отрисовке тег сразу выводит кусок, а когда страница рисуется
+для кэша (request.punch_holes), вместо куска остаётся метка
+<!--hole:имя:аргументы-->. fill() заменяет метки кусками для текущего
+пользователя, так что общая часть страницы рисуется один раз на всех.
+
+Кусок рисует функция, зарегистрированная через register(): она
+получает запрос и строковые аргументы метки и возвращает HTML.
+"""
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+
+MARKER_RE = re.compile(r'<!--hole:(\w+):([^>]*)-->')
+
+_renderers = {}
+
+
+def register(name):
+    def decorator(func):
+        _renderers[name] = func
+        return func
+    return decorator
+
+
+def punching(request):
+    return getattr(request, 'punch_holes', False)
+
+
+def marker(name, *args):
+    encoded = ','.join(quote(str(arg), safe='') for arg in args)
+    return f'<!--hole:{name}:{encoded}-->'
+
+
+def render(request, name, *args):
+    return _renderers[name](request, *(str(arg) for arg in args))
+
+
+def fill(request, content):
+    """Заменяет метки в HTML кусками для request.user."""
+    def replace(match):
+        args = match[2].split(',') if match[2] else []
+        return render(request, match[1], *map(unquote, args))
+
+    return MARKER_RE.sub(replace, content)
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import replication
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Скопировать один раз и завершиться.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.REPLICATION_INTERVAL,
+            help='Пауза между копированиями в секундах.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены, задайте YATUBE_REPLICAS')
+        try:
+            while True:
+                started = time.monotonic()
+                copied, locked = replication.copy_to_replicas()
+                if copied:
+                    self.stdout.write(
+                        f'Скопировано в {", ".join(copied)} за '
+                        f'{time.monotonic() - started:.2f} с'
+                    )
+                if locked:
+                    self.stderr.write(
+                        f'Заняты читателями, пропущены: {", ".join(locked)}'
+                    )
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
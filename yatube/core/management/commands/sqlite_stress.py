@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import stress
+
+MODES = {
+    'plain': ({'journal_mode': 'DELETE'}, 0),
+    'tuned': (None, None),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает временную базу SQLite потоками-писателями и '
+        'процессами-читателями и сравнивает пропускную способность '
+        'с настройками по умолчанию и с SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Длительность каждого прогона в секундах.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=[*MODES, 'both'],
+            default='both',
+        )
+
+    def handle(self, *args, **options):
+        modes = MODES if options['mode'] == 'both' else [options['mode']]
+        duration = options['duration']
+        for mode in modes:
+            pragmas, retries = MODES[mode]
+            totals = stress.run(
+                options['writers'],
+                options['readers'],
+                duration,
+                settings.SQLITE_PRAGMAS if pragmas is None else pragmas,
+                settings.SQLITE_LOCK_RETRIES if retries is None else retries,
+            )
+            self.stdout.write(
+                f'{mode:6}  записей/с {totals["writes"] / duration:8.1f}  '
+                f'ошибок записи {totals["write_errors"]:5}  '
+                f'повторов {totals["retries"]:5}  '
+                f'чтений/с {totals["reads"] / duration:9.1f}  '
+                f'ошибок чтения {totals["read_errors"]:5}'
+            )
@@ -0,0 +1,215 @@
+"""Метрики запросов в памяти процесса.
+
+Middleware собирает замеры каждого запроса в RequestSample, а по его
+завершении раскладывает их в скользящие гистограммы по имени
+представления. render_prometheus() отдаёт всё в текстовом формате
+Prometheus для страницы /metrics/.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'yatube_request_seconds': (
+        'Время обработки запроса', TIME_BUCKETS
+    ),
+    'yatube_sql_queries': (
+        'Число SQL-запросов на HTTP-запрос', COUNT_BUCKETS
+    ),
+    'yatube_sql_seconds': (
+        'Суммарное время SQL-запросов', TIME_BUCKETS
+    ),
+    'yatube_template_seconds': (
+        'Время отрисовки шаблонов', TIME_BUCKETS
+    ),
+    'yatube_db_pool_wait_seconds': (
+        'Ожидание свободного соединения в пуле', TIME_BUCKETS
+    ),
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {}
+_cache_results = defaultdict(int)
+collectors = []
+
+
+class RollingHistogram:
+    """Гистограмма за последние window секунд.
+
+    Окно разбито на slots отрезков: устаревший отрезок обнуляется
+    при следующей записи, поэтому старые замеры постепенно уходят.
+    """
+
+    def __init__(self, buckets, window, slots=6):
+        self.buckets = buckets
+        self.span = window / slots
+        self.slots = [self._empty(None) for _ in range(slots)]
+
+    def _empty(self, epoch):
+        return {
+            'epoch': epoch,
+            'counts': [0] * (len(self.buckets) + 1),
+            'sum': 0.0,
+        }
+
+    def _slot(self, now):
+        epoch = int(now // self.span)
+        index = epoch % len(self.slots)
+        if self.slots[index]['epoch'] != epoch:
+            self.slots[index] = self._empty(epoch)
+        return self.slots[index]
+
+    def observe(self, value, now=None):
+        slot = self._slot(time.time() if now is None else now)
+        slot['counts'][bisect_left(self.buckets, value)] += 1
+        slot['sum'] += value
+
+    def snapshot(self, now=None):
+        """Возвращает накопленные счётчики корзин, сумму и число замеров."""
+        oldest = int((time.time() if now is None else now) // self.span)
+        oldest -= len(self.slots) - 1
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for slot in self.slots:
+            if slot['epoch'] is None or slot['epoch'] < oldest:
+                continue
+            counts = [a + b for a, b in zip(counts, slot['counts'])]
+            total += slot['sum']
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class RequestSample:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.pool_wait = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper: засекает SQL."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.sql_time += duration
+            if len(self.queries) < settings.SLOW_REQUEST_MAX_QUERIES:
+                self.queries.append((duration, sql))
+            else:
+                self.queries.append((duration, None))
+
+
+def start():
+    _local.sample = RequestSample()
+    return _local.sample
+
+
+def stop():
+    _local.sample = None
+
+
+def current():
+    return getattr(_local, 'sample', None)
+
+
+def record_cache(hit):
+    sample = current()
+    if sample is None:
+        return
+    if hit:
+        sample.cache_hits += 1
+    else:
+        sample.cache_misses += 1
+
+
+def observe(name, view, value):
+    with _lock:
+        histogram = _histograms.get((name, view))
+        if histogram is None:
+            histogram = _histograms[(name, view)] = RollingHistogram(
+                HISTOGRAMS[name][1], settings.METRICS_WINDOW
+            )
+        histogram.observe(value)
+
+
+def finish(sample, view):
+    """Раскладывает замеры запроса по гистограммам
+    и возвращает время его обработки."""
+    elapsed = time.perf_counter() - sample.started
+    observe('yatube_request_seconds', view, elapsed)
+    observe('yatube_sql_queries', view, len(sample.queries))
+    observe('yatube_sql_seconds', view, sample.sql_time)
+    observe('yatube_template_seconds', view, sample.template_time)
+    observe('yatube_db_pool_wait_seconds', view, sample.pool_wait)
+    with _lock:
+        _cache_results[(view, 'hit')] += sample.cache_hits
+        _cache_results[(view, 'miss')] += sample.cache_misses
+    return elapsed
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _cache_results.clear()
+
+
+def _labels(**labels):
+    inner = ','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for key, value in labels.items()
+    )
+    return '{' + inner + '}'
+
+
+def _render_histograms():
+    with _lock:
+        items = sorted(_histograms.items())
+        snapshots = [(key, h.buckets, h.snapshot()) for key, h in items]
+    for name, (help_text, _) in HISTOGRAMS.items():
+        yield f'# HELP {name} {help_text}'
+        yield f'# TYPE {name} histogram'
+        for (metric, view), buckets, snapshot in snapshots:
+            if metric != name:
+                continue
+            counts, total, count = snapshot
+            for bound, value in zip((*buckets, '+Inf'), counts):
+                yield f'{name}_bucket{_labels(view=view, le=bound)} {value}'
+            yield f'{name}_sum{_labels(view=view)} {total:.6f}'
+            yield f'{name}_count{_labels(view=view)} {count}'
+
+
+def _render_cache_results():
+    with _lock:
+        results = sorted(_cache_results.items())
+    name = 'yatube_cache_requests_total'
+    yield f'# HELP {name} Обращения к кэшу по представлениям'
+    yield f'# TYPE {name} counter'
+    for (view, result), value in results:
+        yield f'{name}{_labels(view=view, result=result)} {value}'
+
+
+def render_prometheus():
+    lines = [*_render_histograms(), *_render_cache_results()]
+    for collector in collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,110 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+logger = logging.getLogger('yatube.slow_requests')
+
+
+class InstrumentationMiddleware:
+    """Замеряет время, SQL, шаблоны и кэш каждого запроса
+    и складывает их в метрики по имени представления.
+
+    У StreamingHttpResponse тело читается уже после выхода из
+    представления, поэтому его streaming_content оборачивается: SQL
+    при отдаче тела попадает в тот же замер, а замер закрывается, когда
+    тело дочитано.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = metrics.start()
+        try:
+            with self.sql_wrapper(sample):
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, sample
+            )
+        else:
+            self.finish(request, sample)
+        return response
+
+    def sql_wrapper(self, sample):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sample.execute))
+        return stack
+
+    def stream(self, request, content, sample):
+        try:
+            with self.sql_wrapper(sample):
+                yield from content
+        finally:
+            self.finish(request, sample)
+
+    def finish(self, request, sample):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        elapsed = metrics.finish(sample, view)
+        if elapsed >= settings.SLOW_REQUEST_THRESHOLD:
+            self.log_slow(request, view, elapsed, sample)
+
+    def log_slow(self, request, view, elapsed, sample):
+        queries = '\n'.join(
+            f'  {duration * 1000:.1f} ms: {sql}'
+            for duration, sql in sample.queries
+            if sql is not None
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.3f с, SQL: %d за %.3f с, '
+            'шаблоны: %.3f с\n%s',
+            request.method,
+            request.get_full_path(),
+            view,
+            elapsed,
+            len(sample.queries),
+            sample.sql_time,
+            sample.template_time,
+            queries,
+        )
+
+
+class ReadYourWritesMiddleware:
+    """Отправляет чтения GET-запросов в реплики.
+
+    После любой записи пользователь на READ_YOUR_WRITES_WINDOW секунд
+    закрепляется за основной базой через сессию и видит свои новые
+    посты и комментарии, даже пока реплики их не получили.
+    """
+
+    session_key = '_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        if not pinned and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            until = request.session.get(self.session_key, 0)
+            pinned = until > time.time()
+        routers.begin(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end()
+        if wrote:
+            request.session[self.session_key] = (
+                time.time() + settings.READ_YOUR_WRITES_WINDOW
+            )
+        return response
@@ -0,0 +1,72 @@
+"""Замена репликации для локального запуска на SQLite.
+
+Реплики — отдельные файлы SQLite, которые copy_to_replicas()
+перезаписывает снимком основной базы через backup API sqlite3. Команда
+replicate повторяет копирование с заданным интервалом, так что реплики
+отстают от default примерно как настоящие.
+
+Пока реплику читают, SQLite не даёт её перезаписать. Копирование
+в такую реплику повторяется SQLITE_LOCK_RETRIES раз, а если
+она так и не освободилась, пропускается до следующего раза.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# SQLITE_BUSY и SQLITE_LOCKED: модуль sqlite3 до 3.11 их не экспортирует.
+BUSY = (5, 6)
+
+
+class ReplicaLocked(Exception):
+    """Реплику так и не отпустили читатели."""
+
+
+def backup(source, name):
+    """Копирует source в файл name; False, если файл занят читателями.
+
+    Connection.backup() сам повторяет занятый шаг, но без ограничения,
+    поэтому число повторов считает progress.
+    """
+    busy = 0
+
+    def progress(status, remaining, total):
+        nonlocal busy
+        if status in BUSY:
+            busy += 1
+            if busy > settings.SQLITE_LOCK_RETRIES:
+                raise ReplicaLocked(name)
+
+    target = sqlite3.connect(name, timeout=0)
+    try:
+        source.backup(
+            target, progress=progress, sleep=settings.SQLITE_LOCK_BACKOFF
+        )
+        return True
+    except ReplicaLocked:
+        return False
+    finally:
+        target.close()
+
+
+def copy_to_replicas(aliases=None):
+    """Копирует default в реплики.
+
+    Возвращает списки обновлённых реплик и реплик, которые были заняты.
+    """
+    aliases = aliases or settings.DATABASE_REPLICAS
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    copied, locked = [], []
+    source = sqlite3.connect(primary)
+    try:
+        for alias in aliases:
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                raise ValueError(f'{alias}: копирование только для SQLite')
+            if backup(source, connection.settings_dict['NAME']):
+                copied.append(alias)
+            else:
+                locked.append(alias)
+    finally:
+        source.close()
+    return copied, locked
@@ -0,0 +1,70 @@
+"""Маршрутизация запросов к репликам базы.
+
+Запись всегда идёт в default. Чтение уходит в реплику из
+settings.DATABASE_REPLICAS только внутри безопасного HTTP-запроса:
+ReadYourWritesMiddleware снимает закрепление за основной базой на время
+GET и HEAD, если пользователь недавно ничего не записывал. Вне запросов
+(команды, воркеры, тесты) всё читается из default, чтобы пересчёты не
+опирались на отстающую копию.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Сессии читаются там же, куда пишутся, иначе только что выданная
+# сессия может не найтись в реплике.
+PRIMARY_APPS = {'sessions'}
+
+_local = threading.local()
+
+
+def begin(pinned):
+    """Начинает запрос: выбирает реплику и сбрасывает отметку записи."""
+    replicas = settings.DATABASE_REPLICAS
+    _local.pinned = pinned or not replicas
+    _local.replica = random.choice(replicas) if replicas else None
+    _local.wrote = False
+
+
+def end():
+    """Возвращает состояние вне запроса; True, если была запись."""
+    wrote = getattr(_local, 'wrote', False)
+    _local.pinned = True
+    _local.replica = None
+    _local.wrote = False
+    return wrote
+
+
+@contextmanager
+def use_primary():
+    """Читает из основной базы внутри блока."""
+    pinned = getattr(_local, 'pinned', True)
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            getattr(_local, 'pinned', True)
+            or model._meta.app_label in PRIMARY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return _local.replica
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
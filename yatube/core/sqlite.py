@@ -0,0 +1,126 @@
+"""Настройка соединений SQLite и повтор транзакций при блокировке.
+
+configure_connection() подключён к сигналу connection_created и
+выставляет каждому новому соединению PRAGMA из settings.SQLITE_PRAGMAS:
+WAL, чтобы читатели не ждали писателей, busy_timeout, чтобы писатели
+ждали друг друга, а не падали сразу, и настройки кэша.
+
+busy_timeout не помогает, когда транзакция сначала читала, а потом
+захотела писать, пока писал кто-то ещё: SQLite сразу отвечает
+«database is locked». Такую транзакцию остаётся только начать заново —
+это делает retry_on_lock.
+
+Откат транзакции не удаляет того, что сделано вне базы, например
+уже сохранённый файл картинки. Такие действия отменяются функциями,
+переданными в on_rollback().
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    OperationalError,
+    connections,
+    transaction,
+)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+_retries = 0
+_retries_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(raw, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3."""
+    for name, value in pragmas.items():
+        raw.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    # Соединению из пула PRAGMA уже выставлены.
+    if connection.vendor == 'sqlite' and not connection.pool_reused:
+        configure(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+def is_locked(error):
+    return str(error).startswith(LOCK_MESSAGES)
+
+
+def backoff(attempt):
+    """Пауза перед повтором: растёт вдвое, со случайным разбросом."""
+    base = settings.SQLITE_LOCK_BACKOFF * 2 ** (attempt - 1)
+    return base * random.uniform(0.5, 1.5)
+
+
+def _count_retry():
+    global _retries
+    with _retries_lock:
+        _retries += 1
+
+
+def on_rollback(callback):
+    """Вызовет callback, если транзакция retry_on_lock не зафиксируется.
+
+    Вне retry_on_lock ничего не делает.
+    """
+    callbacks = getattr(_local, 'rollback', None)
+    if callbacks is not None:
+        callbacks.append(callback)
+
+
+def _rolled_back():
+    callbacks, _local.rollback = _local.rollback, []
+    for callback in reversed(callbacks):
+        callback()
+
+
+def retry_on_lock(func):
+    """Выполняет func в транзакции и повторяет её при блокировке базы.
+
+    Внутри чужой транзакции повторить нечего, поэтому там ошибка
+    пробрасывается сразу.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        outer = getattr(_local, 'rollback', None)
+        _local.rollback = []
+        try:
+            while True:
+                try:
+                    with transaction.atomic():
+                        result = func(*args, **kwargs)
+                except BaseException as error:
+                    _rolled_back()
+                    if not isinstance(error, OperationalError):
+                        raise
+                    attempt += 1
+                    if (
+                        not is_locked(error)
+                        or attempt > settings.SQLITE_LOCK_RETRIES
+                        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+                    ):
+                        raise
+                    _count_retry()
+                    time.sleep(backoff(attempt))
+                    continue
+                # Внешняя транзакция ещё может откатиться.
+                if outer is not None:
+                    outer.extend(_local.rollback)
+                return result
+        finally:
+            _local.rollback = outer
+
+    return wrapper
+
+
+def prometheus_lines():
+    name = 'yatube_sqlite_lock_retries_total'
+    yield f'# HELP {name} Повторы транзакций из-за блокировки SQLite'
+    yield f'# TYPE {name} counter'
+    yield f'{name} {_retries}'
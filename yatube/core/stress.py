@@ -0,0 +1,148 @@
+"""Нагрузочная проверка SQLite несколькими писателями и читателями.
+
+Прогон идёт на отдельном временном файле с таблицами, похожими на
+посты и комментарии. Писатели — потоки, каждая транзакция которых
+читает счётчик комментариев поста, добавляет комментарий и обновляет
+счётчик, как add_comment. Читатели — отдельные процессы, которые
+выбирают последние комментарии случайного поста. Режим tuned включает
+PRAGMA из настроек и повтор транзакций при блокировке, режим plain —
+настройки SQLite по умолчанию.
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .sqlite import backoff, configure, is_locked
+
+POSTS = 100
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, comment_count INTEGER)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT, created REAL)',
+    'CREATE INDEX comment_post ON comment (post_id, created)',
+)
+
+
+def connect(path, pragmas):
+    # isolation_level=None: транзакциями управляем сами через BEGIN.
+    raw = sqlite3.connect(path, isolation_level=None, timeout=5)
+    configure(raw, pragmas)
+    return raw
+
+
+def prepare(path, pragmas):
+    raw = connect(path, pragmas)
+    for statement in SCHEMA:
+        raw.execute(statement)
+    raw.executemany(
+        'INSERT INTO post (id, comment_count) VALUES (?, 0)',
+        [(number,) for number in range(POSTS)],
+    )
+    raw.close()
+
+
+def write_comment(raw, rng):
+    post_id = rng.randrange(POSTS)
+    raw.execute('BEGIN')
+    try:
+        (count,) = raw.execute(
+            'SELECT comment_count FROM post WHERE id = ?', (post_id,)
+        ).fetchone()
+        raw.execute(
+            'INSERT INTO comment (post_id, text, created) VALUES (?, ?, ?)',
+            (post_id, 'x' * 200, time.time()),
+        )
+        raw.execute(
+            'UPDATE post SET comment_count = ? WHERE id = ?',
+            (count + 1, post_id),
+        )
+        raw.execute('COMMIT')
+    except sqlite3.OperationalError:
+        raw.execute('ROLLBACK')
+        raise
+
+
+def write_loop(path, pragmas, retries, deadline, seed, totals, lock):
+    raw = connect(path, pragmas)
+    rng = random.Random(seed)
+    done = failed = retried = 0
+    while time.monotonic() < deadline:
+        attempt = 0
+        while True:
+            try:
+                write_comment(raw, rng)
+                done += 1
+                break
+            except sqlite3.OperationalError as error:
+                attempt += 1
+                if not is_locked(error) or attempt > retries:
+                    failed += 1
+                    break
+                retried += 1
+                time.sleep(backoff(attempt))
+    raw.close()
+    with lock:
+        totals['writes'] += done
+        totals['write_errors'] += failed
+        totals['retries'] += retried
+
+
+def read_loop(path, pragmas, duration, seed):
+    raw = connect(path, pragmas)
+    rng = random.Random(seed)
+    deadline = time.monotonic() + duration
+    done = failed = 0
+    while time.monotonic() < deadline:
+        try:
+            raw.execute(
+                'SELECT id, text FROM comment WHERE post_id = ? '
+                'ORDER BY created DESC LIMIT 10',
+                (rng.randrange(POSTS),),
+            ).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            failed += 1
+    raw.close()
+    return done, failed
+
+
+def run(writers, readers, duration, pragmas, retries):
+    """Прогоняет нагрузку и возвращает число операций и ошибок."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'stress.sqlite3')
+    prepare(path, pragmas)
+    totals = {'writes': 0, 'write_errors': 0, 'retries': 0}
+    lock = threading.Lock()
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(readers) as pool:
+            pending = pool.starmap_async(
+                read_loop,
+                [(path, pragmas, duration, seed) for seed in range(readers)],
+            )
+            deadline = time.monotonic() + duration
+            threads = [
+                threading.Thread(
+                    target=write_loop,
+                    args=(path, pragmas, retries, deadline, seed, totals,
+                          lock),
+                )
+                for seed in range(writers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            reads = pending.get()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    totals['reads'] = sum(done for done, _ in reads)
+    totals['read_errors'] = sum(failed for _, failed in reads)
+    return totals
@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, *args):
+    """Кусок страницы, свой для каждого пользователя (см. core/holes.py)."""
+    request = context['request']
+    if holes.punching(request):
+        return mark_safe(holes.marker(name, *args))
+    return mark_safe(holes.render(request, name, *args))
@@ -1,6 +1,37 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
 from yatube.settings import DEBUG
 
+from posts.cache import cached_page
+
+from . import metrics, replication, stress
+from .backends.pool import ConnectionPool, PoolTimeout
+from .cache import FileBasedCache, SQLiteCache, cache_stats
+from .middleware import ReadYourWritesMiddleware
+from .routers import ReplicaRouter
+from .sqlite import on_rollback, retry_on_lock
+
+User = get_user_model()
+
 
 class CoreTests(TestCase):
     def test_404_page_uses_correct_template(self) -> None:
@@ -8,3 +39,356 @@ class CoreTests(TestCase):
         if not DEBUG:
             response = self.client.get('/missing/')
             self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': ':memory:',
+            'OPTIONS': {
+                'MAX_ENTRIES': 4,
+                'CULL_FREQUENCY': 4,
+                'ACCESS_RESOLUTION': 0,
+                'CULL_EVERY': 1,
+            },
+        }
+    }
+)
+class SQLiteCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_least_recently_used_keys_are_evicted(self) -> None:
+        """Проверяет, что при переполнении вытесняются ключи,
+        которые дольше всех не читали."""
+        for key in 'abcd':
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('e', 'e')
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('e'), 'e')
+
+    def test_add_and_incr_are_atomic(self) -> None:
+        """Проверяет add и incr по целому значению."""
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.cache.add('lock', 2))
+        self.assertEqual(self.cache.incr('lock', 5), 6)
+        self.assertEqual(self.cache.get('lock'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_on_non_integer_values(self) -> None:
+        """Проверяет incr по дробному значению в SQLite- и файловом
+        кэше: ключ не должен получать префикс дважды."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backends = (self.cache, FileBasedCache(directory, {}))
+        for backend in backends:
+            with self.subTest(backend=type(backend).__name__):
+                backend.set('float', 1.5)
+                self.assertEqual(backend.incr('float', 2), 3.5)
+                self.assertEqual(backend.get('float'), 3.5)
+                self.assertEqual(backend.incr('float', 1, version=1), 4.5)
+
+    def test_versions_do_not_mix(self) -> None:
+        """Проверяет, что ключи разных версий независимы."""
+        self.cache.set('key', 'old', version=1)
+        self.cache.set('key', 'new', version=2)
+        self.assertEqual(self.cache.get('key', version=1), 'old')
+        self.assertEqual(
+            self.cache.get_many(['key'], version=2), {'key': 'new'}
+        )
+
+    def test_hits_and_misses_are_counted_by_prefix(self) -> None:
+        """Проверяет счётчики попаданий по префиксу ключа."""
+        before = cache_stats().get('counted', (0, 0))
+        self.cache.set('counted:1', 1)
+        self.cache.get('counted:1')
+        self.cache.get('counted:2')
+        self.cache.get_many(['counted:1', 'counted.3'])
+        hits, misses = cache_stats()['counted']
+        self.assertEqual((hits - before[0], misses - before[1]), (2, 2))
+
+    def test_reads_and_writes_avoid_extra_statements(self) -> None:
+        """Проверяет, что свежая отметка о чтении не перезаписывается,
+        а число ключей проверяется раз в CULL_EVERY записей."""
+        store = SQLiteCache(
+            ':memory:',
+            {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_EVERY': 3}},
+        )
+        statements = []
+        store._db.set_trace_callback(statements.append)
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        self.assertFalse([sql for sql in statements if 'COUNT' in sql])
+        self.assertFalse([sql for sql in statements if 'accessed =' in sql])
+        store.set('c', 3)
+        self.assertTrue([sql for sql in statements if 'COUNT' in sql])
+
+    def test_touch_validates_key(self) -> None:
+        """Проверяет, что touch проверяет ключ, как остальные методы."""
+        with self.assertWarns(CacheKeyWarning):
+            self.cache.touch('bad key')
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_user('admin', is_staff=True)
+        cls.user = User.objects.create_user('user')
+
+    def setUp(self) -> None:
+        cache.clear()
+        metrics.reset()
+
+    def test_view_samples_are_exported(self) -> None:
+        """Проверяет, что замеры запроса попадают в метрики
+        по имени представления."""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        for name in metrics.HISTOGRAMS:
+            self.assertIn(f'{name}_count{{view="posts:index"}} 1', body)
+        self.assertIn(
+            'yatube_cache_requests_total{view="posts:index",result="miss"}',
+            body,
+        )
+
+    def test_metrics_are_admin_only(self) -> None:
+        """Проверяет, что метрики недоступны обычному пользователю."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_is_logged_with_sql(self) -> None:
+        """Проверяет, что медленный запрос пишется в лог вместе с SQL."""
+        with self.assertLogs('yatube.slow_requests') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_streaming_body_sql_is_counted(self) -> None:
+        """Проверяет, что SQL, выполненный при чтении тела
+        StreamingHttpResponse, попадает в замер запроса."""
+        with self.assertLogs('yatube.slow_requests') as logs:
+            response = self.client.get(
+                reverse('posts:api_posts'), {'export': 1}
+            )
+            b''.join(response.streaming_content)
+        self.assertIn('posts:api_posts', logs.output[0])
+        self.assertIn('SQL: 1 ', logs.output[0])
+
+    def test_histogram_forgets_old_samples(self) -> None:
+        """Проверяет, что замеры старше окна не учитываются."""
+        histogram = metrics.RollingHistogram((1, 2), window=60, slots=6)
+        histogram.observe(0.5, now=0)
+        histogram.observe(1.5, now=30)
+        self.assertEqual(histogram.snapshot(now=30), ([1, 2, 2], 2.0, 2))
+        self.assertEqual(histogram.snapshot(now=65), ([0, 1, 1], 1.5, 1))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.session = SessionStore()
+        self.session.create()
+        self.routes = []
+
+    def request(self, method='get', write=False):
+        def view(request):
+            self.routes.append(self.router.db_for_read(User))
+            if write:
+                self.router.db_for_write(User)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.session_key
+        request.session = self.session
+        ReadYourWritesMiddleware(view)(request)
+        return self.routes[-1]
+
+    @property
+    def session_key(self):
+        return self.session.session_key
+
+    def test_reads_outside_requests_use_primary(self) -> None:
+        """Проверяет, что вне запроса чтение идёт в основную базу."""
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+
+    def test_get_reads_from_replica(self) -> None:
+        """Проверяет, что GET без недавних записей читает из реплики."""
+        self.assertEqual(self.request(), 'replica1')
+
+    def test_reads_stick_to_primary_after_write(self) -> None:
+        """Проверяет, что после записи чтения пользователя
+        идут в основную базу, пока не истечёт окно."""
+        self.assertEqual(self.request('post', write=True), 'default')
+        self.assertEqual(self.request(), 'default')
+        with override_settings(READ_YOUR_WRITES_WINDOW=-1):
+            self.request('post', write=True)
+        self.assertEqual(self.request(), 'replica1')
+
+    def test_cached_pages_are_rendered_from_primary(self) -> None:
+        """Проверяет, что страница для общего кэша рисуется
+        по основной базе даже в запросе, который читает реплику."""
+        cache.clear()
+
+        def view(request):
+            self.routes.append(self.router.db_for_read(User))
+            return cached_page(
+                request,
+                'replica_test',
+                ('index',),
+                lambda: HttpResponse(self.router.db_for_read(User)),
+            )
+
+        request = RequestFactory().get('/')
+        request.session = self.session
+        request.user = AnonymousUser()
+        response = ReadYourWritesMiddleware(view)(request)
+        self.assertEqual(self.routes, ['replica1'])
+        self.assertEqual(response.content, b'default')
+
+
+@override_settings(SQLITE_LOCK_RETRIES=2, SQLITE_LOCK_BACKOFF=0)
+class ReplicationTests(SimpleTestCase):
+    def setUp(self) -> None:
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.source = sqlite3.connect(os.path.join(directory, 'primary'))
+        self.source.execute('CREATE TABLE t (x)')
+        self.source.commit()
+        self.addCleanup(self.source.close)
+        self.replica = os.path.join(directory, 'replica')
+        sqlite3.connect(self.replica).close()
+
+    def test_locked_replica_is_skipped(self) -> None:
+        """Проверяет, что реплика с открытым читателем пропускается,
+        а после его ухода копируется."""
+        reader = sqlite3.connect(self.replica, isolation_level=None)
+        self.addCleanup(reader.close)
+        reader.execute('BEGIN')
+        reader.execute('SELECT * FROM sqlite_master').fetchall()
+        self.assertFalse(replication.backup(self.source, self.replica))
+        reader.execute('COMMIT')
+        self.assertTrue(replication.backup(self.source, self.replica))
+        tables = reader.execute('SELECT name FROM sqlite_master').fetchall()
+        self.assertEqual(tables, [('t',)])
+
+
+@override_settings(SQLITE_LOCK_BACKOFF=0)
+class SQLiteTuningTests(TransactionTestCase):
+    def failing(self, error, times):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(1)
+            if len(calls) <= times:
+                raise OperationalError(error)
+            return 'ok'
+
+        return write, calls
+
+    def test_pragmas_are_applied_to_new_connections(self) -> None:
+        """Проверяет, что новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+
+    def test_locked_transaction_is_retried(self) -> None:
+        """Проверяет, что транзакция повторяется при блокировке базы."""
+        write, calls = self.failing('database is locked', 2)
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_and_exhausted_retries_are_raised(self) -> None:
+        """Проверяет, что прочие ошибки не повторяются, а блокировка
+        повторяется не больше SQLITE_LOCK_RETRIES раз."""
+        write, calls = self.failing('no such table: posts_post', 1)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+        write, calls = self.failing('database is locked', 100)
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), settings.SQLITE_LOCK_RETRIES + 1)
+
+    def test_failed_attempts_are_undone(self) -> None:
+        """Проверяет, что после неудачной попытки отменяется сделанное
+        вне базы, а on_commit срабатывает только для удачной."""
+        calls, undone, committed = [], [], []
+
+        @retry_on_lock
+        def write():
+            calls.append(1)
+            attempt = len(calls)
+            on_rollback(lambda: undone.append(attempt))
+            transaction.on_commit(lambda: committed.append(attempt))
+            if attempt < 3:
+                raise OperationalError('database is locked')
+
+        write()
+        self.assertEqual(undone, [1, 2])
+        self.assertEqual(committed, [3])
+
+    def test_stress_run_reports_reads_and_writes(self) -> None:
+        """Проверяет, что нагрузочный прогон пишет и читает параллельно."""
+        totals = stress.run(2, 1, 0.5, settings.SQLITE_PRAGMAS, 5)
+        self.assertGreater(totals['writes'], 0)
+        self.assertGreater(totals['reads'], 0)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.opened = []
+
+    def connect(self):
+        raw = sqlite3.connect(':memory:')
+        self.opened.append(raw)
+        return raw
+
+    def acquire(self, pool, healthy=lambda raw: True):
+        return pool.acquire(self.connect, healthy)
+
+    def test_released_connection_is_reused(self) -> None:
+        """Проверяет, что возвращённое соединение выдаётся снова."""
+        pool = ConnectionPool('default', size=2, timeout=1, max_age=None)
+        raw, reused = self.acquire(pool)
+        self.assertFalse(reused)
+        pool.release(raw)
+        self.assertEqual(self.acquire(pool), (raw, True))
+        self.assertEqual(len(self.opened), 1)
+
+    def test_pool_is_bounded(self) -> None:
+        """Проверяет, что сверх размера пула соединение не выдаётся."""
+        pool = ConnectionPool('default', size=1, timeout=0.01, max_age=None)
+        self.acquire(pool)
+        with self.assertRaises(PoolTimeout):
+            self.acquire(pool)
+
+    def test_broken_and_expired_connections_are_replaced(self) -> None:
+        """Проверяет, что неисправное или устаревшее соединение
+        закрывается, а вместо него открывается новое."""
+        pool = ConnectionPool('default', size=1, timeout=1, max_age=None)
+        raw, _ = self.acquire(pool)
+        pool.release(raw)
+        fresh, reused = self.acquire(pool, healthy=lambda raw: False)
+        self.assertFalse(reused)
+        self.assertIsNot(fresh, raw)
+        pool.release(fresh)
+        pool.max_age = 0
+        self.assertFalse(self.acquire(pool)[1])
+        self.assertEqual(pool.discarded, 2)
@@ -0,0 +1,230 @@
+"""JSON API только для чтения: ленты постов, пост с комментариями.
+
+Строки берутся через values(), без создания моделей, и кодируются
+в JSON по мере чтения, так что ответ отдаётся StreamingHttpResponse.
+Списки листаются курсором KeysetPaginator по тем же индексам, что
+и HTML-страницы. С ?export=1 список отдаётся целиком, таблица
+читается порциями по API_EXPORT_CHUNK_SIZE строк.
+
+?fields=id,text — какие поля вернуть, ?limit= — размер страницы.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from . import feed
+from .models import Comment, Group, Post
+from .utils import InvalidCursor, KeysetPaginator
+
+User = get_user_model()
+
+POST_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'updated',
+    'author',
+    'group',
+    'image',
+    'image_width',
+    'image_height',
+    'comment_count',
+)
+POST_SOURCES = {
+    'id': 'pk',
+    'author': 'author__username',
+    'group': 'group__slug',
+}
+POST_ORDERING = ('-pub_date', '-pk')
+COMMENT_FIELDS = ('id', 'author', 'text', 'created')
+COMMENT_SOURCES = {'id': 'pk', 'author': 'author__username'}
+COMMENT_ORDERING = ('created', 'pk')
+# Сколько байт JSON копить перед отправкой очередного куска ответа.
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """GET/HEAD-view, которое отвечает на ApiError JSON-ошибкой."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def select_fields(request, fields):
+    raw = request.GET.get('fields')
+    if not raw:
+        return fields
+    chosen = tuple(
+        dict.fromkeys(name.strip() for name in raw.split(',') if name.strip())
+    )
+    unknown = set(chosen) - set(fields)
+    if not chosen or unknown:
+        raise ApiError(f'Доступные поля: {", ".join(fields)}')
+    return chosen
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def columns(fields, sources, ordering=()):
+    """Колонки для values(): поля ответа и ключ сортировки."""
+    names = [sources.get(field, field) for field in fields]
+    names += [name.lstrip('-') for name in ordering]
+    return list(dict.fromkeys(names))
+
+
+def serialize(row, fields, sources):
+    item = {}
+    for field in fields:
+        value = row[sources.get(field, field)]
+        if field == 'image':
+            value = default_storage.url(value) if value else None
+        item[field] = value
+    return item
+
+
+def encode(rows, fields, sources, **extra):
+    """Кодирует список по частям: {"results": [...], **extra}."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    buffer, size = ['{"results": ['], 0
+    for index, row in enumerate(rows):
+        chunk = encoder.encode(serialize(row, fields, sources))
+        buffer.append(f', {chunk}' if index else chunk)
+        size += len(chunk)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(']')
+    for key, value in extra.items():
+        buffer.append(f', {encoder.encode(key)}: {encoder.encode(value)}')
+    buffer.append('}')
+    yield ''.join(buffer)
+
+
+def stream_list(
+    request, queryset, ordering=POST_ORDERING,
+    fields=POST_FIELDS, sources=POST_SOURCES,
+):
+    fields = select_fields(request, fields)
+    rows = queryset.values(*columns(fields, sources, ordering))
+    if request.GET.get('export'):
+        rows = rows.order_by(*ordering).iterator(
+            chunk_size=settings.API_EXPORT_CHUNK_SIZE
+        )
+        content = encode(rows, fields, sources)
+    else:
+        paginator = KeysetPaginator(
+            rows, page_size(request), ordering=ordering
+        )
+        cursor = request.GET.get('cursor')
+        try:
+            page = (
+                paginator.page_from_cursor(cursor)
+                if cursor
+                else paginator.first_page()
+            )
+        except InvalidCursor as error:
+            raise ApiError(str(error))
+        content = encode(
+            page,
+            fields,
+            sources,
+            next_cursor=page.next_cursor,
+            previous_cursor=page.previous_cursor,
+        )
+    return StreamingHttpResponse(content, content_type='application/json')
+
+
+def pk_or_404(queryset, message):
+    pk = queryset.values_list('pk', flat=True).first()
+    if pk is None:
+        raise ApiError(message, status=404)
+    return pk
+
+
+@api_view
+def post_list(request):
+    return stream_list(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    group_id = pk_or_404(Group.objects.filter(slug=slug), 'Группа не найдена')
+    return stream_list(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view
+def profile_posts(request, username):
+    author_id = pk_or_404(
+        User.objects.filter(username=username), 'Автор не найден'
+    )
+    return stream_list(request, Post.objects.filter(author_id=author_id))
+
+
+@api_view
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти', status=401)
+    return stream_list(
+        request, feed.feed_for(request.user), ordering=feed.ORDERING
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    """Пост и первая страница комментариев к нему."""
+    fields = select_fields(request, POST_FIELDS)
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values(*columns(fields, POST_SOURCES))
+        .first()
+    )
+    if row is None:
+        raise ApiError('Пост не найден', status=404)
+    comments = KeysetPaginator(
+        Comment.objects.filter(post_id=post_id).values(
+            *columns(COMMENT_FIELDS, COMMENT_SOURCES, COMMENT_ORDERING)
+        ),
+        settings.COMMENTS_PER_PAGE,
+        ordering=COMMENT_ORDERING,
+    ).first_page()
+    post = serialize(row, fields, POST_SOURCES)
+    post['comments'] = [
+        serialize(comment, COMMENT_FIELDS, COMMENT_SOURCES)
+        for comment in comments
+    ]
+    post['comments_next_cursor'] = comments.next_cursor
+    return JsonResponse(post, json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def post_comments(request, post_id):
+    pk_or_404(Post.objects.filter(pk=post_id), 'Пост не найден')
+    return stream_list(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        ordering=COMMENT_ORDERING,
+        fields=COMMENT_FIELDS,
+        sources=COMMENT_SOURCES,
+    )
@@ -0,0 +1,253 @@
+"""Нагрузочный прогон страниц постов на синтетических данных.
+
+generate() заполняет пустую базу пользователями, группами, постами,
+комментариями и подписками из Faker с фиксированным seed, поэтому
+прогоны с одинаковыми параметрами сравнимы между собой. run() ходит
+тестовым клиентом по страницам и считает перцентили времени ответа,
+число SQL-запросов и пик выделенной памяти на запрос.
+
+Время и запросы меряются на прогретом кэше, память — на холодном:
+перед каждым замером памяти кэш очищается, чтобы пик включал рендер
+страницы, а не только чтение готового ответа (memory_cache в JSON).
+
+Прогон работает со своим кэшем в памяти процесса (CACHES), чтобы
+не очищать общий кэш сайта и не складывать в него синтетические
+страницы.
+"""
+import math
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import transfer
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PAGES = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+def dataset_sizes(posts):
+    """Число записей каждого вида для набора из posts постов."""
+    users = max(posts // 10, 2)
+    return {
+        'users': users,
+        'groups': max(users // 10, 1),
+        'posts': posts,
+        'comments': posts * 2,
+        'follows': users * 5,
+    }
+
+
+def generate(posts, seed, batch_size=500):
+    """Заполняет базу синтетическими данными и возвращает их размеры.
+
+    batch_size не больше 500: SQLite не принимает составной SELECT
+    длиннее, а bulk_create строит именно его.
+    """
+    sizes = dataset_sizes(posts)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    now = timezone.now()
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'user{number}',
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password='!',
+            )
+            for number in range(sizes['users'])
+        ),
+        batch_size=batch_size,
+    )
+    Group.objects.bulk_create(
+        Group(
+            title=fake.sentence(nb_words=3),
+            slug=f'group{number}',
+            description=fake.paragraph(),
+        )
+        for number in range(sizes['groups'])
+    )
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    transfer.bulk_create_dated(
+        Post,
+        [
+            Post(
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids + [None]),
+                text=fake.paragraph(nb_sentences=5),
+                pub_date=now - timedelta(minutes=rng.randrange(10 ** 6)),
+                updated=now,
+            )
+            for _ in range(sizes['posts'])
+        ],
+        batch_size=batch_size,
+    )
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    transfer.bulk_create_dated(
+        Comment,
+        [
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=fake.sentence(),
+                created=now - timedelta(minutes=rng.randrange(10 ** 5)),
+            )
+            for _ in range(sizes['comments'])
+        ],
+        batch_size=batch_size,
+    )
+    follows = set()
+    while len(follows) < min(
+        sizes['follows'], len(user_ids) * (len(user_ids) - 1)
+    ):
+        user_id, author_id = rng.sample(user_ids, 2)
+        follows.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in sorted(follows)
+        ),
+        batch_size=batch_size,
+    )
+    transfer.finish_import()
+    return sizes
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = min(max(math.ceil(share * len(ordered)), 1), len(ordered))
+    return ordered[rank - 1]
+
+
+class Targets:
+    """Случайные адреса страниц из сгенерированных данных."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        self.post_ids = list(Post.objects.values_list('pk', flat=True))
+
+    def page(self):
+        return {'page': self.rng.randint(1, 5)}
+
+    def url(self, name):
+        if name == 'group_list':
+            kwargs = {'slug': self.rng.choice(self.slugs)}
+        elif name == 'profile':
+            kwargs = {'username': self.rng.choice(self.usernames)}
+        elif name == 'post_detail':
+            return reverse(
+                'posts:post_detail',
+                kwargs={'post_id': self.rng.choice(self.post_ids)},
+            ), {}
+        else:
+            kwargs = {}
+        return reverse(f'posts:{name}', kwargs=kwargs), self.page()
+
+
+def reader():
+    """Пользователь с наибольшим числом подписок — для ленты."""
+    return User.objects.order_by('-stats__following_count').first()
+
+
+def measure(client, targets, name, requests, memory_requests):
+    latencies, queries = [], []
+    for _ in range(requests):
+        url, params = targets.url(name)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        queries.append(len(captured))
+    peaks = []
+    for _ in range(memory_requests):
+        url, params = targets.url(name)
+        cache.clear()
+        # reset_peak() есть только с Python 3.9, поэтому пик
+        # сбрасывается перезапуском трассировки.
+        tracemalloc.start()
+        try:
+            client.get(url, params)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return {
+        'page': name,
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'memory_peak_kb_p50': round(percentile(peaks, 0.5), 1)
+        if peaks else None,
+        'memory_peak_kb_max': round(max(peaks), 1) if peaks else None,
+        'memory_cache': 'cold',
+    }
+
+
+def run(seed, requests, memory_requests, pages=PAGES):
+    """Прогоняет страницы по уже сгенерированным данным."""
+    with override_settings(CACHES=CACHES):
+        cache.clear()
+        targets = Targets(seed)
+        client = Client()
+        client.force_login(reader())
+        return [
+            measure(client, targets, name, requests, memory_requests)
+            for name in pages
+        ]
+
+
+def compare(current, previous):
+    """Сопоставляет результаты двух прогонов по размеру и странице.
+
+    Возвращает строки (размер, страница, p95 было, p95 стало,
+    запросов было, запросов стало).
+    """
+    before = {
+        (entry['posts'], row['page']): row
+        for entry in previous['runs']
+        for row in entry['results']
+    }
+    rows = []
+    for entry in current['runs']:
+        for row in entry['results']:
+            old = before.get((entry['posts'], row['page']))
+            if old is None:
+                continue
+            rows.append((
+                entry['posts'],
+                row['page'],
+                old['p95_ms'],
+                row['p95_ms'],
+                old['queries_mean'],
+                row['queries_mean'],
+            ))
+    return rows
@@ -0,0 +1,320 @@
+"""Кэширование страниц и инвалидация закэшированных фрагментов.
+
+Карточка поста (posts/includes/post_card.html) кэшируется по ключу
+(post.pk, post.updated). Редактирование поста меняет updated само,
+а переименование группы или смена имени автора «трогают» updated
+у всех связанных постов одним UPDATE.
+
+Страницы index, group_list и profile кэшируются целиком под ключом,
+в который входят номера версий их областей: `index`, `group:<slug>`,
+`profile:<username>` и общая область `all`. Сигналы увеличивают версию
+при изменении постов, комментариев и подписок, поэтому закэшированная
+страница живёт долго и обновляется только при изменении содержимого.
+Пересчитывает устаревшую страницу только тот процесс, который
+захватил блокировку, остальные отдают предыдущую версию.
+
+Гостям страница отдаётся из кэша целиком. Для вошедших пользователей
+в кэше лежит общая для всех копия, в которой шапка, кнопка подписки
+и форма комментария оставлены дырками (см. core/holes.py), — они
+дорисовываются для каждого запроса.
+
+Из тех же версий строится ETag, а рядом с версией хранится время
+последнего изменения области для Last-Modified. Поэтому на условный
+GET страница отвечает 304 по одному обращению к кэшу, не доставая
+и не отрисовывая её. Отрисованная страница сохраняется в кэш уже со
+своими валидаторами, и устаревшая копия не получит чужой ETag.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from core import holes, routers
+
+from .models import Post
+
+GROUP_CARD_FIELDS = ('title', 'slug')
+AUTHOR_CARD_FIELDS = ('username', 'first_name', 'last_name')
+GLOBAL_SCOPE = 'all'
+
+
+def touch_posts(**filters):
+    Post.objects.filter(**filters).update(updated=timezone.now())
+
+
+def card_fields_changed(instance, fields, update_fields=None):
+    """Проверяет, меняет ли сохранение поля, которые видны в карточке."""
+    if instance._state.adding or instance.pk is None:
+        return False
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return False
+    stored = type(instance)._default_manager.filter(pk=instance.pk).values(
+        *fields
+    ).first()
+    if stored is None:
+        return False
+    return any(stored[name] != getattr(instance, name) for name in fields)
+
+
+def _version_key(scope):
+    return f'page_version:{scope}'
+
+
+def _seed():
+    # Версия начинается с текущего времени, чтобы после очистки
+    # или вытеснения счётчика не совпасть со старыми ключами.
+    return int(time.time() * 1000)
+
+
+def _modified_key(scope):
+    return f'page_modified:{scope}'
+
+
+def page_state(scopes):
+    """Возвращает версии областей и время их последнего изменения.
+
+    Пропавшие из кэша значения создаются заново: версия — от текущего
+    времени, время изменения — текущее.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    modified_keys = [_modified_key(scope) for scope in scopes]
+    found = cache.get_many(keys + modified_keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _seed(), None)
+            found[key] = cache.get(key)
+    for key in modified_keys:
+        if key not in found:
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return (
+        [found[key] for key in keys],
+        max(found[key] for key in modified_keys),
+    )
+
+
+def request_page_state(request, scopes):
+    """page_state(), посчитанный один раз на запрос."""
+    states = request.__dict__.setdefault('_page_states', {})
+    scopes = tuple(scopes)
+    if scopes not in states:
+        states[scopes] = page_state(scopes)
+    return states[scopes]
+
+
+def _digest(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def page_etag(name, versions, *extra):
+    """ETag общей части страницы: версии областей и прочие части."""
+    return _digest(name, *versions, *extra)
+
+
+def user_etag(request, etag):
+    """ETag страницы с дырками, дорисованными для пользователя.
+
+    В него входит и CSRF-cookie: после повторного входа в форме
+    комментария другой токен.
+    """
+    if not request.user.is_authenticated:
+        return etag
+    return _digest(etag, request.user.pk, request.META.get('CSRF_COOKIE'))
+
+
+def as_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def stamp(response, etag, last_modified):
+    """Проставляет валидаторы ответу, который уйдёт в кэш."""
+    if response.status_code == 200:
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def http_cache(view):
+    """Выставляет Cache-Control страницам.
+
+    Анонимный ответ без cookie одинаков для всех, и прокси может держать
+    его ANONYMOUS_PAGE_MAX_AGE секунд. Браузер и остальные ответы каждый
+    раз перепроверяются по ETag.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD'):
+            return response
+        if response.status_code not in (200, 304):
+            return response
+        shared = not (
+            request.user.is_authenticated
+            or request.META.get('CSRF_COOKIE_USED')
+            or response.cookies
+        )
+        if shared:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=0,
+                s_maxage=settings.ANONYMOUS_PAGE_MAX_AGE,
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+def bump(*scopes):
+    """Сбрасывает закэшированные страницы перечисленных областей."""
+    scopes = set(scopes)
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), None)
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    """bump() сейчас и ещё раз после фиксации текущей транзакции.
+
+    Пока транзакция не зафиксирована, параллельный запрос видит старые
+    данные и может положить страницу с ними в кэш под уже новой
+    версией. Второй сброс после фиксации такую страницу вытесняет.
+    Первый нужен тем, кто читает внутри этой же транзакции.
+    """
+    bump(*scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump(*scopes))
+
+
+def post_scopes(post):
+    scopes = ['index', f'profile:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def _page_key(name, scopes, request, *extra):
+    versions = request_page_state(request, scopes)[0]
+    versions = '.'.join(map(str, (*versions, *extra)))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    variant = 'shared' if request.user.is_authenticated else 'anonymous'
+    return (
+        f'page:{name}:{versions}:{variant}:{path}',
+        f'page:{name}:{variant}:{path}',
+    )
+
+
+def _render_and_store(key, latest_key, render):
+    # Страница в кэше общая и живёт под новой версией до следующего
+    # изменения, поэтому рисуется по основной базе: реплика может
+    # ещё не знать о записи, которая эту версию подняла.
+    with routers.use_primary():
+        response = render()
+    if response.status_code == 200:
+        cache.set_many(
+            {key: response, latest_key: response},
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+    return response
+
+
+def get_or_render(key, latest_key, render):
+    """Возвращает страницу из кэша, пересчитывая её не более чем
+    в одном процессе одновременно."""
+    response = cache.get(key)
+    if response is not None:
+        return response
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+        try:
+            return _render_and_store(key, latest_key, render)
+        finally:
+            cache.delete(lock_key)
+    stale = cache.get(latest_key)
+    if stale is not None:
+        return stale
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = cache.get(key)
+        if response is not None:
+            return response
+    return render()
+
+
+def cached_page(request, name, scopes, render, *extra):
+    """Отдаёт GET-ответ render() из кэша под версиями областей.
+
+    `extra` — прочее, от чего зависит страница, кроме адреса и версий.
+    """
+    if request.method != 'GET':
+        return render()
+    state = request_page_state(request, scopes)
+    etag = page_etag(name, state[0], *extra)
+    last_modified = as_datetime(state[1])
+    key, latest_key = _page_key(name, scopes, request, *extra)
+
+    def render_shared():
+        request.punch_holes = request.user.is_authenticated
+        try:
+            return stamp(render(), etag, last_modified)
+        finally:
+            request.punch_holes = False
+
+    response = get_or_render(key, latest_key, render_shared)
+    if response.status_code != 200:
+        return response
+    if request.user.is_authenticated:
+        response.content = holes.fill(request, response.content.decode())
+    if response.has_header('ETag'):
+        stored = response['ETag'].strip('"')
+        response['ETag'] = quote_etag(user_etag(request, stored))
+    return response
+
+
+def versioned_page(scope):
+    """Кэширует GET-ответы view-функции под версией области `scope`
+    (см. cached_page) и отвечает 304, если у клиента та же версия.
+
+    `scope` — шаблон имени области, в который подставляются
+    именованные аргументы view, например 'group:{slug}'.
+    """
+    def decorator(view):
+        def scopes(**kwargs):
+            return (GLOBAL_SCOPE, scope.format(**kwargs))
+
+        def state(request, **kwargs):
+            return request_page_state(request, scopes(**kwargs))
+
+        def etag(request, **kwargs):
+            versions = state(request, **kwargs)[0]
+            return user_etag(request, page_etag(view.__name__, versions))
+
+        def last_modified(request, **kwargs):
+            return as_datetime(state(request, **kwargs)[1])
+
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            return cached_page(
+                request,
+                view.__name__,
+                scopes(**kwargs),
+                lambda: view(request, **kwargs),
+            )
+        return condition(etag, last_modified)(wrapper)
+    return decorator
@@ -0,0 +1,200 @@
+"""Материализованная лента подписок.
+
+Новый пост сразу раскладывается в ленты подписчиков автора
+(fan-out-on-write), поэтому чтение ленты — это выборка по индексу
+(user, -pub_date) таблицы FeedEntry. Посты авторов, у которых больше
+FEED_CELEBRITY_THRESHOLD подписчиков, не раскладываются, а подмешиваются
+в ленту при чтении (fan-out-on-read).
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+logger = logging.getLogger('yatube.feed')
+
+CELEBRITIES_CACHE_KEY = 'feed_celebrities'
+ORDERING = ('-feed_date', '-pk')
+
+
+def celebrity_ids():
+    """Возвращает множество id авторов, посты которых
+    подмешиваются в ленту при чтении."""
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = set(
+            UserStats.objects.filter(
+                follower_count__gt=settings.FEED_CELEBRITY_THRESHOLD
+            ).values_list('user', flat=True)
+        )
+        cache.set(
+            CELEBRITIES_CACHE_KEY, ids, settings.FEED_CELEBRITIES_TIMEOUT
+        )
+    return ids
+
+
+def follower_count(author_id):
+    try:
+        return UserStats.objects.get(user_id=author_id).follower_count
+    except UserStats.DoesNotExist:
+        return Follow.objects.filter(author_id=author_id).count()
+
+
+def is_celebrity(author_id):
+    return follower_count(author_id) > settings.FEED_CELEBRITY_THRESHOLD
+
+
+def _entry(user_id, post):
+    return FeedEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user', flat=True
+    )
+    FeedEntry.objects.bulk_create(
+        (_entry(user_id, post) for user_id in followers.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора."""
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author', 'pub_date'
+    )[:settings.FEED_BACKFILL_LIMIT]
+    FeedEntry.objects.bulk_create(
+        (_entry(user_id, post) for post in posts),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_followers(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков.
+
+    Нужна, когда автор перестаёт быть «знаменитостью»: его посты
+    больше не подмешиваются при чтении. Это происходит внутри запроса
+    на отписку, поэтому подписчикам достаётся не больше
+    FEED_FOLLOWERS_BACKFILL_LIMIT постов, а посты читаются один раз.
+    Старые посты вернёт команда `rebuild_feeds --author <username>`,
+    о чём on_follow_deleted пишет в лог.
+    """
+    posts = list(
+        Post.objects.filter(author_id=author_id).only(
+            'pk', 'author', 'pub_date'
+        )[:settings.FEED_FOLLOWERS_BACKFILL_LIMIT]
+    )
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user', flat=True
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            _entry(user_id, post)
+            for user_id in followers.iterator()
+            for post in posts
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты подписчика все посты автора."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(authors=None):
+    """Пересобирает ленты читателей по таблице подписок.
+
+    Последние посты каждого автора читаются одним запросом и сразу
+    раскладываются всем его подписчикам. Каждый автор пересобирается
+    в своей транзакции, чтобы не держать базу на весь пересчёт.
+    authors ограничивает пересборку постами этих авторов.
+    """
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    follows = Follow.objects.exclude(author__in=celebrity_ids())
+    entries = FeedEntry.objects.all()
+    if authors is not None:
+        follows = follows.filter(author__in=authors)
+        entries = entries.filter(author__in=authors)
+    followers = defaultdict(list)
+    for user_id, author_id in follows.values_list('user', 'author').iterator():
+        followers[author_id].append(user_id)
+    entries.exclude(author__in=follows.values('author')).delete()
+    for author_id, user_ids in followers.items():
+        posts = list(
+            Post.objects.filter(author_id=author_id).only(
+                'pk', 'author', 'pub_date'
+            )[:settings.FEED_BACKFILL_LIMIT]
+        )
+        with transaction.atomic():
+            FeedEntry.objects.filter(author_id=author_id).delete()
+            FeedEntry.objects.bulk_create(
+                (
+                    _entry(user_id, post)
+                    for user_id in user_ids
+                    for post in posts
+                ),
+                batch_size=settings.FEED_BATCH_SIZE,
+            )
+
+
+def on_follow_created(follow):
+    followers = follower_count(follow.author_id)
+    if followers > settings.FEED_CELEBRITY_THRESHOLD:
+        if followers == settings.FEED_CELEBRITY_THRESHOLD + 1:
+            cache.delete(CELEBRITIES_CACHE_KEY)
+        return
+    backfill(follow.user_id, follow.author_id)
+
+
+def on_follow_deleted(follow):
+    remove_author(follow.user_id, follow.author_id)
+    followers = follower_count(follow.author_id)
+    if followers == settings.FEED_CELEBRITY_THRESHOLD:
+        cache.delete(CELEBRITIES_CACHE_KEY)
+        backfill_followers(follow.author_id)
+        logger.info(
+            'Автор %s больше не знаменитость, ленты подписчиков неполные: '
+            'выполните rebuild_feeds --author %s',
+            follow.author_id,
+            follow.author.username,
+        )
+
+
+def feed_for(user):
+    """Возвращает посты ленты подписок пользователя.
+
+    Посты размечены полем feed_date: лента сортируется по ORDERING,
+    чтобы выборка шла по индексу FeedEntry, а не по таблице постов.
+    """
+    celebrities = celebrity_ids()
+    if celebrities:
+        celebrities = list(
+            Follow.objects.filter(
+                user=user, author__in=celebrities
+            ).values_list('author', flat=True)
+        )
+    if not celebrities:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date')
+        )
+    entries = FeedEntry.objects.filter(user=user).values('post')
+    return Post.objects.filter(
+        Q(pk__in=entries) | Q(author__in=celebrities)
+    ).annotate(feed_date=F('pub_date'))
@@ -1,6 +1,11 @@
 from django import forms
+from django.contrib.auth import get_user_model
+from PIL import Image
 
-from .models import Comment, Post
+from . import images
+from .models import Comment, Group, Post
+
+User = get_user_model()
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +18,34 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # retry_on_lock создаёт форму заново для того же запроса,
+        # а загруженный файл к этому времени уже прочитан.
+        for upload in self.files.values():
+            upload.seek(0)
+
+    def clean_image(self):
+        """Пересохраняет новую картинку (см. posts/images.py)."""
+        image = self.cleaned_data.get('image')
+        if image and 'image' in self.changed_data:
+            # Заголовок файла Django уже проверил, но сами пиксели
+            # могут оказаться битыми или слишком большими.
+            try:
+                image, width, height = images.normalize(image)
+            except (Image.DecompressionBombError, OSError):
+                raise forms.ValidationError(
+                    'Не удалось обработать картинку'
+                )
+            self.instance.image_width = width
+            self.instance.image_height = height
+            self.instance.image_size = image.size
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_size = None
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -21,3 +54,23 @@ class CommentForm(forms.ModelForm):
         labels = {
             'text': 'Текст',
         }
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Запрос', max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        label='Группа',
+        required=False,
+        to_field_name='slug',
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise forms.ValidationError('Такого автора нет')
@@ -0,0 +1,77 @@
+"""Обработка картинок постов при загрузке.
+
+Картинка поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIZE
+по большей стороне и пересохраняется в POST_IMAGE_FORMAT с качеством
+POST_IMAGE_QUALITY. Метаданные при пересохранении не копируются.
+Если Pillow собран без WebP, картинка сохраняется прогрессивным JPEG.
+Анимированные картинки хранятся как есть, чтобы не потерять кадры.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from core.sqlite import on_rollback
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def output_format():
+    if settings.POST_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+
+def flatten(image, fmt):
+    """Переводит картинку в режим, который поддерживает формат."""
+    if fmt == 'WEBP' and image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize(upload):
+    """Возвращает (файл, ширина, высота) для загруженной картинки."""
+    upload.seek(0)
+    with Image.open(upload) as source:
+        if getattr(source, 'is_animated', False):
+            upload.seek(0)
+            return upload, source.width, source.height
+        image = ImageOps.exif_transpose(source)
+        limit = settings.POST_IMAGE_MAX_SIZE
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        fmt = output_format()
+        image = flatten(image, fmt)
+        buffer = BytesIO()
+        image.save(
+            buffer,
+            fmt,
+            quality=settings.POST_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    content = ContentFile(buffer.getvalue(), f'{name}.{EXTENSIONS[fmt]}')
+    return content, image.width, image.height
+
+
+def delete_on_rollback(post):
+    """Удалит файл новой картинки поста, если транзакция откатится.
+
+    Файл пишется в хранилище при post.save(), и повтор транзакции
+    в retry_on_lock сохранил бы его ещё раз под другим именем.
+    """
+    image = post.image
+
+    def delete():
+        if image._committed:
+            image.storage.delete(image.name)
+
+    on_rollback(delete)
@@ -0,0 +1,40 @@
+"""Хранилище ключей sorl-thumbnail с пакетным чтением.
+
+Стандартный cached_db KVStore достаёт каждую миниатюру отдельным
+обращением к кэшу и, при промахе, отдельным запросом к базе. get_many
+делает то же для нескольких миниатюр сразу: один get_many в кэш
+и один запрос с IN на все промахи.
+"""
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def get_many(self, image_files):
+        """Возвращает {ключ файла: ImageFile} для найденных файлов."""
+        keys = {
+            add_prefix(image_file.key): image_file.key
+            for image_file in image_files
+        }
+        found = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list(
+                    'key', 'value'
+                )
+            )
+            # Промахи тоже кэшируются, как в _get_raw.
+            values = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(values, settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(values)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in found.items()
+            if value and value != EMPTY_VALUE
+        }
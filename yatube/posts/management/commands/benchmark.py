@@ -0,0 +1,127 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа, число запросов и память страниц постов '
+        'на синтетических данных нескольких размеров. Данные создаются '
+        'в отдельной тестовой базе, кэш — в памяти процесса и очищается '
+        'перед каждым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,5000',
+            help='Числа постов через запятую.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Запросов к каждой странице для замера времени.',
+        )
+        parser.add_argument(
+            '--memory-requests',
+            type=int,
+            default=10,
+            help='Запросов к каждой странице для замера памяти.',
+        )
+        parser.add_argument(
+            '--pages',
+            default=','.join(benchmark.PAGES),
+            help='Страницы через запятую.',
+        )
+        parser.add_argument('-o', '--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes: ожидаются числа через запятую')
+        pages = options['pages'].split(',')
+        unknown = set(pages) - set(benchmark.PAGES)
+        if unknown:
+            raise CommandError(f'Неизвестные страницы: {unknown}')
+        report = {
+            'started': timezone.now().isoformat(),
+            'seed': options['seed'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'runs': [],
+        }
+        setup_test_environment(debug=False)
+        try:
+            for size in sizes:
+                report['runs'].append(self.run_size(size, pages, options))
+        finally:
+            teardown_test_environment()
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            json.dump(report, stream, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f'Результаты сохранены в {options["output"]}')
+        )
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                previous = json.load(stream)
+            self.stdout.write('posts  page          p95 ms        queries')
+            for row in benchmark.compare(report, previous):
+                size, page, old_p95, p95, old_queries, queries = row
+                self.stdout.write(
+                    f'{size:<6} {page:<13} {old_p95:>6} → {p95:<6} '
+                    f'{old_queries:>5} → {queries}'
+                )
+
+    def run_size(self, size, pages, options):
+        # Версии кэша, которые поднимает создание данных, тоже
+        # не должны попасть в общий кэш.
+        with override_settings(CACHES=benchmark.CACHES):
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                started = time.monotonic()
+                counts = benchmark.generate(size, options['seed'])
+                generated = time.monotonic() - started
+                self.stdout.write(
+                    f'{size} постов: данные созданы за {generated:.1f} с '
+                    f'({counts})'
+                )
+                results = benchmark.run(
+                    options['seed'],
+                    options['requests'],
+                    options['memory_requests'],
+                    pages,
+                )
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        for row in results:
+            self.stdout.write(
+                f'  {row["page"]:<13} p50 {row["p50_ms"]:>8} мс  '
+                f'p95 {row["p95_ms"]:>8} мс  p99 {row["p99_ms"]:>8} мс  '
+                f'SQL {row["queries_mean"]:>5}  '
+                f'память {row["memory_peak_kb_max"]} КБ (холодный кэш)'
+            )
+        return {
+            'posts': size,
+            'dataset': counts,
+            'generate_seconds': round(generated, 2),
+            'results': results,
+        }
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии или подписки в JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=transfer.KINDS)
+        parser.add_argument(
+            '-o', '--output', help='Файл для записи, по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='jsonl'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        kind, fmt = options['kind'], options['format']
+        fields = transfer.KINDS[kind][1]
+        stream = (
+            open(options['output'], 'w', encoding='utf-8', newline='')
+            if options['output']
+            else sys.stdout
+        )
+        started = time.monotonic()
+        total = 0
+        try:
+            rows = transfer.export_rows(kind, options['batch_size'])
+            for _ in transfer.write_rows(rows, stream, fmt, fields):
+                total += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено {total} записей за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} в секунду)'
+        )
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии или подписки из JSONL или CSV '
+        'и пересчитывает счётчики и ленты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=transfer.KINDS)
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument(
+            '--format',
+            choices=transfer.FORMATS,
+            help='По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Создавать пользователей, которых нет в базе.',
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересчитывать счётчики и ленты после загрузки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lstrip('.')
+            fmt = extension if extension in transfer.FORMATS else 'jsonl'
+        importer = transfer.Importer(
+            options['kind'], create_users=options['create_users']
+        )
+        stream = (
+            sys.stdin
+            if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        started = time.monotonic()
+        try:
+            rows = transfer.read_rows(stream, fmt)
+            for batch in transfer.chunks(rows, options['batch_size']):
+                importer.load(batch)
+                if options['verbosity'] > 1:
+                    self.report(importer, started)
+        except (KeyError, ValueError, transfer.TransferError) as error:
+            raise CommandError(
+                f'Ошибка после {importer.created} записей: {error!r}'
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.report(importer, started)
+        if not options['skip_rebuild']:
+            rebuild_started = time.monotonic()
+            transfer.finish_import()
+            self.stdout.write(
+                'Счётчики и ленты пересчитаны за '
+                f'{time.monotonic() - rebuild_started:.1f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
+
+    def report(self, importer, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Загружено {importer.created}, пропущено {importer.skipped} '
+            f'за {elapsed:.1f} с '
+            f'({importer.created / max(elapsed, 1e-6):.0f} в секунду)'
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import resize
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет уменьшенные копии картинок, которые не запрашивали '
+        'дольше RESIZE_CACHE_TTL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            help='Срок в днях вместо RESIZE_CACHE_TTL.',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        removed = resize.prune(None if days is None else days * 86400)
+        self.stdout.write(self.style.SUCCESS(f'Удалено копий: {removed}'))
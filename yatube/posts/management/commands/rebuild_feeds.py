@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import feed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок. С --author — только посты этих '
+        'авторов, например после того как автор перестал быть '
+        '«знаменитостью» и подписчики получили лишь последние посты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--author',
+            action='append',
+            dest='authors',
+            metavar='USERNAME',
+            help='Автор, посты которого раскладываются заново.',
+        )
+
+    def handle(self, *args, **options):
+        authors = None
+        if options['authors']:
+            found = dict(
+                User.objects.filter(
+                    username__in=options['authors']
+                ).values_list('username', 'pk')
+            )
+            unknown = set(options['authors']) - found.keys()
+            if unknown:
+                raise CommandError(
+                    f'Нет пользователей: {", ".join(sorted(unknown))}'
+                )
+            authors = list(found.values())
+        feed.rebuild(authors)
+        self.stdout.write(self.style.SUCCESS('Ленты пересобраны'))
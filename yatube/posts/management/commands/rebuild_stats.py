@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок '
+        'пользователей и счётчики комментариев постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить сохранённые счётчики с таблицами.',
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.find_drift()
+        for user_id, field, actual, expected in drift:
+            self.stdout.write(
+                f'user {user_id}: {field} = {actual}, ожидалось {expected}'
+            )
+        comment_drift = stats.find_comment_drift()
+        for post_id, actual, expected in comment_drift:
+            self.stdout.write(
+                f'post {post_id}: comment_count = {actual}, '
+                f'ожидалось {expected}'
+            )
+        drift += comment_drift
+        if options['check']:
+            if drift:
+                raise CommandError(f'Расхождений: {len(drift)}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        total = stats.rebuild_all()
+        stats.rebuild_comment_counts()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитано пользователей: {total}, '
+                f'исправлено расхождений: {len(drift)}'
+            )
+        )
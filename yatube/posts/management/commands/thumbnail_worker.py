@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок постов из очереди задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Число процессов пула, 0 — в текущем процессе.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться.',
+        )
+        parser.add_argument(
+            '--enqueue-missing',
+            action='store_true',
+            help='Поставить в очередь посты с картинкой без миниатюры.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            posts = Post.objects.exclude(image='').filter(thumbnail='')
+            queued = sum(
+                thumbnails.enqueue(post) is not None
+                for post in posts.only('pk', 'image', 'thumbnail').iterator()
+            )
+            self.stdout.write(f'Поставлено в очередь: {queued}')
+        pool = None
+        if options['workers'] != 0:
+            pool = thumbnails.worker_pool(options['workers'])
+        done = 0
+        try:
+            while True:
+                processed = thumbnails.run_once(pool)
+                done += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Обработано задач: {done}'))
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    """Заполняет счётчики сгруппированными COUNT, как stats.count_all()."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    counters = {
+        'post_count': (Post, 'author'),
+        'comment_count': (Comment, 'author'),
+        'follower_count': (Follow, 'author'),
+        'following_count': (Follow, 'user'),
+    }
+    totals = {
+        user_id: dict.fromkeys(counters, 0)
+        for user_id in User.objects.values_list('pk', flat=True)
+    }
+    for field, (model, owner) in counters.items():
+        rows = (
+            model.objects.order_by()
+            .values(owner)
+            .annotate(total=models.Count('pk'))
+            .values_list(owner, 'total')
+        )
+        for user_id, total in rows:
+            totals[user_id][field] = total
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id, **values)
+            for user_id, values in totals.items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_auto_20261018_0757'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('post_count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='Комментариев')),
+                ('follower_count', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,201 @@
+"""Уменьшенные копии картинок по запросу: /resize/<w>x<h>/<метка>/<путь>.
+
+Адрес лежит вне MEDIA_URL, чтобы его не перехватил веб-сервер, который
+отдаёт MEDIA_ROOT. Метка — хэш от имени, размера и времени изменения
+исходника (source_token), поэтому у пересохранённого исходника другой
+адрес, а копию можно отдавать с вечным Cache-Control. Запрос со старой
+меткой перенаправляется на текущий адрес; ссылки строит url().
+
+Размеры ограничены списком RESIZE_SIZES. Готовая копия хранится на
+диске под RESIZE_CACHE_DIR в MEDIA_ROOT, а её имя — хэш от того же
+исходника, размеров копии и параметров сжатия.
+
+Копию готовит только тот процесс, который захватил блокировку в кэше,
+остальные ждут, пока файл появится (как get_or_render в posts/cache.py).
+Файл сначала пишется во временный, а потом переименовывается, так что
+наполовину записанную копию никто не увидит.
+
+Если перед приложением стоит веб-сервер, файл может отдавать он:
+RESIZE_SENDFILE = 'X-Sendfile' передаёт ему путь к файлу,
+'X-Accel-Redirect' — адрес под RESIZE_ACCEL_PREFIX.
+
+Исходниками могут быть только файлы под RESIZE_SOURCE_PREFIX. Копии,
+которые не запрашивали дольше RESIZE_CACHE_TTL, удаляет команда
+prune_resized: время изменения копии обновляется при отдаче, но
+не чаще раза в половину этого срока.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from PIL import Image, ImageOps
+
+from .images import EXTENSIONS, flatten, output_format
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+def allowed(width, height):
+    return f'{width}x{height}' in settings.RESIZE_SIZES
+
+
+def allowed_source(path):
+    """Исходник — картинка поста, а не копия или другой файл."""
+    return posixpath.normpath(path).startswith(settings.RESIZE_SOURCE_PREFIX)
+
+
+def source_token(source):
+    """Метка версии исходника для адреса; OSError, если его нет."""
+    stamp = default_storage.get_modified_time(source).timestamp()
+    parts = (source, default_storage.size(source), stamp)
+    return hashlib.sha256('\0'.join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def url(source, width, height):
+    """Адрес копии source размером width x height."""
+    return reverse(
+        'posts:resized_image',
+        kwargs={
+            'width': width,
+            'height': height,
+            'token': source_token(source),
+            'path': source,
+        },
+    )
+
+
+def variant_key(source, width, height, fmt):
+    """Адрес копии; бросает OSError, если исходника нет."""
+    stamp = default_storage.get_modified_time(source).timestamp()
+    parts = (
+        source,
+        default_storage.size(source),
+        stamp,
+        f'{width}x{height}',
+        fmt,
+        settings.POST_IMAGE_QUALITY,
+    )
+    return hashlib.sha256('\0'.join(map(str, parts)).encode()).hexdigest()
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.RESIZE_CACHE_DIR)
+
+
+def variant_path(key, fmt):
+    name = f'{key}.{EXTENSIONS[fmt]}'
+    return os.path.join(cache_root(), key[:2], key[2:4], name)
+
+
+def ready(path):
+    """Есть ли копия; у давно созданной обновляет время изменения."""
+    try:
+        modified = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    if time.time() - modified > settings.RESIZE_CACHE_TTL / 2:
+        os.utime(path)
+    return True
+
+
+def prune(max_age=None):
+    """Удаляет копии старше max_age секунд и возвращает их число."""
+    max_age = settings.RESIZE_CACHE_TTL if max_age is None else max_age
+    deadline = time.time() - max_age
+    removed = 0
+    for directory, _, names in os.walk(cache_root(), topdown=False):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                if os.stat(path).st_mtime < deadline:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if directory != cache_root():
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+    return removed
+
+
+def generate(source, width, height, fmt, path):
+    """Уменьшает source до width x height с обрезкой по центру."""
+    with default_storage.open(source) as stream, Image.open(stream) as image:
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        image = flatten(image, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            image.save(
+                output,
+                fmt,
+                quality=settings.POST_IMAGE_QUALITY,
+                optimize=True,
+                progressive=True,
+            )
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+def get_variant(source, width, height):
+    """Возвращает (ключ, путь к файлу, тип) копии, готовя её при нужде."""
+    fmt = output_format()
+    key = variant_key(source, width, height, fmt)
+    path = variant_path(key, fmt)
+    if ready(path):
+        return key, path, CONTENT_TYPES[fmt]
+    lock_key = f'resize:{key}:lock'
+    if cache.add(lock_key, 1, settings.RESIZE_LOCK_TIMEOUT):
+        try:
+            if not os.path.exists(path):
+                generate(source, width, height, fmt, path)
+        finally:
+            cache.delete(lock_key)
+        return key, path, CONTENT_TYPES[fmt]
+    deadline = time.monotonic() + settings.RESIZE_LOCK_WAIT
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    # Тот, кто держит блокировку, мог упасть: тогда готовим сами.
+    if not os.path.exists(path):
+        generate(source, width, height, fmt, path)
+    return key, path, CONTENT_TYPES[fmt]
+
+
+def respond(request, key, path, content_type):
+    """Отдаёт копию с вечным Cache-Control или 304 по ETag."""
+    etag = quote_etag(key)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        header = settings.RESIZE_SENDFILE
+        if header is None:
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type
+            )
+        else:
+            response = HttpResponse(content_type=content_type)
+            if header == 'X-Accel-Redirect':
+                relative = os.path.relpath(path, cache_root())
+                response[header] = settings.RESIZE_ACCEL_PREFIX + relative
+            else:
+                response[header] = path
+    response['ETag'] = etag
+    patch_cache_control(
+        response, public=True, max_age=settings.RESIZE_MAX_AGE, immutable=True
+    )
+    return response
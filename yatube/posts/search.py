@@ -0,0 +1,194 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — таблица SQLite FTS5 posts_post_fts, которую триггеры из
+миграции 0015 обновляют при каждом изменении posts_post. Результаты
+сортируются по релевантности bm25 с поправкой на свежесть поста:
+каждые сутки новизны добавляют SEARCH_RECENCY_WEIGHT к оценке.
+Оценка не зависит от текущего времени, поэтому по ней можно листать
+курсором.
+
+SQLite пересоздаёт таблицу posts_post при некоторых миграциях, и
+триггеры пропадают вместе с ней. Поэтому после каждого migrate
+ensure_triggers() возвращает их и при необходимости перестраивает
+индекс.
+
+На других базах индекса нет: каждое слово ищется через icontains,
+а результаты идут от новых постов к старым.
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+WORD_RE = re.compile(r'\w+')
+
+SCORE_SQL = (
+    '-bm25(posts_post_fts) + %s * julianday(posts_post.pub_date)'
+)
+
+TRIGGERS = {
+    'posts_post_fts_insert': """
+        CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post
+        BEGIN
+            INSERT INTO posts_post_fts (rowid, text)
+            VALUES (new.id, new.text);
+        END
+    """,
+    'posts_post_fts_delete': """
+        CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post
+        BEGIN
+            INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    """,
+    'posts_post_fts_update': """
+        CREATE TRIGGER posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post
+        BEGIN
+            INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO posts_post_fts (rowid, text)
+            VALUES (new.id, new.text);
+        END
+    """,
+}
+
+
+def ensure_triggers(using='default', **kwargs):
+    """Создаёт пропавшие триггеры индекса и перестраивает его."""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            'SELECT name FROM sqlite_master WHERE name LIKE %s',
+            ('posts_post_fts%',),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if 'posts_post_fts' not in existing:
+            return
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            cursor.execute(
+                'INSERT INTO posts_post_fts (posts_post_fts) '
+                "VALUES ('rebuild')"
+            )
+
+
+def match_expression(query):
+    """Переводит строку пользователя в запрос FTS5.
+
+    Каждое слово ищется как префикс, все слова должны встретиться.
+    Кавычки и операторы FTS5 из ввода не пропускаются.
+    """
+    words = WORD_RE.findall(query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset посты, подходящие под запрос."""
+    if fts_available():
+        return queryset.filter(pk__in=matching_ids(query))
+    for word in WORD_RE.findall(query):
+        queryset = queryset.filter(text__icontains=word)
+    return queryset
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос, для pk__in."""
+    return RawSQL(
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        (match_expression(query),),
+    )
+
+
+def encode_cursor(score, pk):
+    raw = json.dumps([score, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, pk = json.loads(raw.decode())
+        return float(score), int(pk)
+    except (binascii.Error, TypeError, ValueError):
+        return None
+
+
+def ranked_rows(expression, group, author, position, limit):
+    """(id, оценка) подходящих постов по индексу FTS5."""
+    weight = settings.SEARCH_RECENCY_WEIGHT
+    conditions = ['posts_post_fts MATCH %s']
+    params = [weight, expression]
+    if group is not None:
+        conditions.append('posts_post.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        conditions.append('posts_post.author_id = %s')
+        params.append(author.pk)
+    if position is not None:
+        conditions.append(
+            f'({SCORE_SQL} < %s OR ({SCORE_SQL} = %s AND posts_post.id < %s))'
+        )
+        score, pk = position
+        params.extend([weight, score, weight, score, pk])
+    params.append(limit)
+    sql = (
+        f'SELECT posts_post.id, {SCORE_SQL} AS score '
+        'FROM posts_post_fts '
+        'JOIN posts_post ON posts_post.id = posts_post_fts.rowid '
+        f'WHERE {" AND ".join(conditions)} '
+        'ORDER BY score DESC, posts_post.id DESC LIMIT %s'
+    )
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        return db.fetchall()
+
+
+def recent_rows(query, group, author, position, limit):
+    """(id, id) подходящих постов без индекса, новые первыми."""
+    posts = filter_posts(Post.objects.all(), query)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    if position is not None:
+        posts = posts.filter(pk__lt=position[1])
+    pks = posts.order_by('-pk').values_list('pk', flat=True)[:limit]
+    return [(pk, pk) for pk in pks]
+
+
+def search(query, group=None, author=None, cursor=None, limit=None):
+    """Ищет посты и возвращает страницу результатов и курсор следующей.
+
+    Выборка id и оценок идёт одним запросом к индексу, посты со всеми
+    связями подгружаются вторым запросом только для этой страницы.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    limit = limit or settings.NOTES_NUMBER
+    position = decode_cursor(cursor) if cursor else None
+    if fts_available():
+        rows = ranked_rows(expression, group, author, position, limit + 1)
+    else:
+        rows = recent_rows(query, group, author, position, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+    return [posts[pk] for pk, _ in rows if pk in posts], next_cursor
@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, feed, stats
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'post_count')
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.decrement(instance.author_id, 'post_count')
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'comment_count')
+        stats.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.decrement(instance.author_id, 'comment_count')
+    stats.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'follower_count')
+        stats.increment(instance.user_id, 'following_count')
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.decrement(instance.author_id, 'follower_count')
+    stats.decrement(instance.user_id, 'following_count')
+
+
+# Обработчики ленты подключаются после счётчиков: им нужно
+# уже обновлённое число подписчиков автора.
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_new_follow(sender, instance, created, **kwargs):
+    if created:
+        feed.on_follow_created(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed_on_unfollow(sender, instance, **kwargs):
+    feed.on_follow_deleted(instance)
+
+
+# Страницы сбрасываются только после фиксации транзакции
+# (cache.bump_on_commit): иначе параллельный запрос успеет отрисовать
+# страницу по старым данным и положить её в кэш под новой версией.
+@receiver(pre_save, sender=Group)
+def refresh_group_cards(sender, instance, update_fields=None, **kwargs):
+    if cache.card_fields_changed(
+        instance, cache.GROUP_CARD_FIELDS, update_fields
+    ):
+        cache.touch_posts(group_id=instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def refresh_author_cards(sender, instance, update_fields=None, **kwargs):
+    instance._card_fields_changed = cache.card_fields_changed(
+        instance, cache.AUTHOR_CARD_FIELDS, update_fields
+    )
+    if instance._card_fields_changed:
+        cache.touch_posts(author_id=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def refresh_group_pages(sender, instance, created, **kwargs):
+    if created:
+        cache.bump_on_commit(f'group:{instance.slug}')
+    else:
+        cache.bump_on_commit(cache.GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=User)
+def refresh_profile_pages(sender, instance, created, **kwargs):
+    if created:
+        cache.bump_on_commit(f'profile:{instance.username}')
+    elif getattr(instance, '_card_fields_changed', False):
+        cache.bump_on_commit(cache.GLOBAL_SCOPE)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_pages(sender, instance, **kwargs):
+    # При смене группы пост должен пропасть и со страницы старой группы.
+    instance._previous_page_scopes = []
+    if not instance._state.adding:
+        stored = Post.objects.filter(pk=instance.pk).first()
+        if stored is not None:
+            instance._previous_page_scopes = cache.post_scopes(stored)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def refresh_post_pages(sender, instance, **kwargs):
+    scopes = getattr(instance, '_previous_page_scopes', [])
+    cache.bump_on_commit(*scopes, *cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_commented_post_pages(sender, instance, **kwargs):
+    cache.bump_on_commit(*cache.post_scopes(instance.post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def refresh_followed_profile_page(sender, instance, **kwargs):
+    cache.bump_on_commit(f'profile:{instance.author.username}')
@@ -0,0 +1,139 @@
+"""Денормализованные счётчики пользователя и поста.
+
+Счётчики меняются F-выражениями в сигналах создания и удаления
+постов, комментариев и подписок, поэтому страницы профиля, поста
+и списки постов не считают COUNT(*) по таблицам. Пересчитать их с нуля
+можно командой `manage.py rebuild_stats`.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+COUNTERS = {
+    'post_count': (Post, 'author'),
+    'comment_count': (Comment, 'author'),
+    'follower_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_for(user_id):
+    """Считает счётчики пользователя по таблицам."""
+    return {
+        field: model.objects.filter(**{f'{owner}_id': user_id}).count()
+        for field, (model, owner) in COUNTERS.items()
+    }
+
+
+def rebuild_for(user_id):
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=count_for(user_id)
+    )
+    return stats
+
+
+def get_stats(user):
+    """Возвращает счётчики пользователя, создавая их при необходимости."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return rebuild_for(user.pk)
+
+
+def increment(user_id, field):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + 1}
+    )
+    if not updated:
+        rebuild_for(user_id)
+
+
+def decrement(user_id, field):
+    # Запись не создаётся: пользователь может удаляться каскадно
+    # вместе со своими постами.
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) - 1}
+    )
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def _comment_totals():
+    return Coalesce(
+        Subquery(
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def find_comment_drift():
+    """Возвращает список (post_id, сохранено, должно быть)."""
+    return list(
+        Post.objects.annotate(expected=_comment_totals())
+        .exclude(comment_count=F('expected'))
+        .values_list('pk', 'comment_count', 'expected')
+    )
+
+
+def rebuild_comment_counts():
+    return Post.objects.update(comment_count=_comment_totals())
+
+
+def count_all():
+    """Считает счётчики всех пользователей по таблицам."""
+    totals = {
+        user_id: dict.fromkeys(COUNTERS, 0)
+        for user_id in User.objects.values_list('pk', flat=True)
+    }
+    for field, (model, owner) in COUNTERS.items():
+        rows = (
+            model.objects.order_by()
+            .values(owner)
+            .annotate(total=Count('pk'))
+            .values_list(owner, 'total')
+        )
+        for user_id, total in rows:
+            totals[user_id][field] = total
+    return totals
+
+
+def find_drift():
+    """Возвращает список (user_id, поле, сохранено, должно быть)."""
+    stored = {stats.user_id: stats for stats in UserStats.objects.all()}
+    drift = []
+    for user_id, counters in count_all().items():
+        stats = stored.get(user_id)
+        for field, expected in counters.items():
+            actual = getattr(stats, field) if stats else None
+            if actual != expected:
+                drift.append((user_id, field, actual, expected))
+    return drift
+
+
+def rebuild_all(batch_size=500):
+    """Перезаписывает счётчики всех пользователей."""
+    with transaction.atomic():
+        totals = count_all()
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create(
+            (
+                UserStats(user_id=user_id, **counters)
+                for user_id, counters in totals.items()
+            ),
+            batch_size=batch_size,
+        )
+    return len(totals)
@@ -0,0 +1,27 @@
+from django import template
+from django.conf import settings
+
+from ..utils import ELLIPSIS, elided_page_range
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/page_links.html')
+def page_links(page_obj):
+    """Ссылки на страницы вокруг текущей и по краям (elided_page_range).
+
+    Число страниц может быть приблизительным, поэтому текущая страница
+    всегда считается входящей в диапазон.
+    """
+    number = page_obj.number
+    num_pages = max(page_obj.paginator.num_pages, number)
+    return {
+        'number': number,
+        'pages': elided_page_range(
+            number,
+            num_pages,
+            settings.PAGINATOR_ON_EACH_SIDE,
+            settings.PAGINATOR_ON_ENDS,
+        ),
+        'ellipsis': ELLIPSIS,
+    }
@@ -0,0 +1,35 @@
+from django import template
+from django.conf import settings
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag(
+    'posts/includes/post_thumbnail.html', takes_context=True
+)
+def post_thumbnail(context, post):
+    """Миниатюра поста с вариантами по ширине для srcset.
+
+    Если вариантов в хранилище нет (миниатюра готовилась до их
+    появления), выводится одна основная миниатюра.
+    """
+    variants = []
+    if post.image:
+        variants = thumbnails.variants(post.image.name, context.get('request'))
+    if variants:
+        width, height = variants[-1].size
+    else:
+        width, height = map(
+            int, settings.POST_THUMBNAIL_GEOMETRY.split('x')
+        )
+    return {
+        'src': post.thumbnail_url,
+        'srcset': ', '.join(
+            f'{variant.url} {variant.width}w' for variant in variants
+        ),
+        'sizes': settings.POST_THUMBNAIL_SIZES,
+        'width': width,
+        'height': height,
+    }
@@ -0,0 +1,101 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read_json(response):
+    if response.streaming:
+        return json.loads(b''.join(response.streaming_content))
+    return json.loads(response.content)
+
+
+@override_settings(API_PAGE_SIZE=3)
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = mixer.blend(User, username='writer')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend(Group, slug='news')
+        cls.posts = mixer.cycle(5).blend(
+            Post, author=cls.author, group=cls.group, image=''
+        )
+        mixer.blend(Post, author=cls.reader, image='')
+        cls.comments = mixer.cycle(2).blend(
+            Comment, post=cls.posts[0], author=cls.reader
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def test_cursor_walks_all_posts(self) -> None:
+        """Проверяет, что курсор проходит ленту без пропусков и повторов."""
+        url = reverse('posts:api_group_posts', kwargs={'slug': 'news'})
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor or ''})
+            self.assertEqual(response['Content-Type'], 'application/json')
+            data = read_json(response)
+            ids += [post['id'] for post in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        expected = Post.objects.filter(group=self.group).values_list(
+            'pk', flat=True
+        )
+        self.assertEqual(ids, list(expected))
+
+    def test_fields_selection(self) -> None:
+        """Проверяет, что ?fields= ограничивает поля ответа,
+        а неизвестное поле даёт 400."""
+        url = reverse('posts:api_profile_posts', kwargs={'username': 'writer'})
+        data = read_json(self.client.get(url, {'fields': 'id,author'}))
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        self.assertEqual(data['results'][0]['author'], 'writer')
+        response = self.client.get(url, {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_streams_everything_in_one_query(self) -> None:
+        """Проверяет, что выгрузка отдаёт все посты одним запросом."""
+        response = self.client.get(
+            reverse('posts:api_posts'), {'export': 1}
+        )
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            data = read_json(response)
+        self.assertEqual(len(data['results']), Post.objects.count())
+
+    def test_post_detail_with_comments(self) -> None:
+        """Проверяет, что пост отдаётся вместе с комментариями."""
+        post = self.posts[0]
+        url = reverse('posts:api_post_detail', kwargs={'post_id': post.pk})
+        with self.assertNumQueries(2):
+            data = read_json(self.client.get(url))
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.comments],
+        )
+        url = reverse('posts:api_post_detail', kwargs={'post_id': 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_follow_feed_requires_login(self) -> None:
+        """Проверяет, что лента подписок доступна только вошедшему."""
+        url = reverse('posts:api_follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        data = read_json(self.reader_client.get(url, {'limit': 10}))
+        self.assertEqual(
+            {post['author'] for post in data['results']}, {'writer'}
+        )
+        self.assertEqual(len(data['results']), 5)
+
+    def test_api_is_read_only(self) -> None:
+        """Проверяет, что API не принимает POST."""
+        response = self.client.post(reverse('posts:api_posts'))
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class BenchmarkTest(TestCase):
+    def test_percentile(self) -> None:
+        """Проверяет перцентиль по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 50)
+        self.assertEqual(benchmark.percentile(values, 0.95), 95)
+        self.assertEqual(benchmark.percentile([7], 0.99), 7)
+
+    def test_generate_is_reproducible_and_run_covers_pages(self) -> None:
+        """Проверяет, что данные создаются по seed в нужном объёме,
+        а прогон возвращает строку для каждой страницы и не трогает
+        общий кэш."""
+        sizes = benchmark.generate(40, seed=1)
+        self.assertEqual(Post.objects.count(), sizes['posts'])
+        self.assertEqual(Comment.objects.count(), sizes['comments'])
+        texts = list(Post.objects.order_by('pk').values_list('text'))
+        cache.set('benchmark-marker', 1)
+        results = benchmark.run(seed=1, requests=2, memory_requests=1)
+        self.assertEqual(
+            [row['page'] for row in results], list(benchmark.PAGES)
+        )
+        for row in results:
+            self.assertEqual(row['requests'], 2)
+            self.assertIsNotNone(row['memory_peak_kb_max'])
+            self.assertEqual(row['memory_cache'], 'cold')
+        self.assertEqual(cache.get('benchmark-marker'), 1)
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        benchmark.generate(40, seed=1)
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('text')), texts
+        )
@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from ..cache import GLOBAL_SCOPE, page_state
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = mixer.blend(User, username='auth')
+        cls.group = mixer.blend(Group, slug='news')
+        cls.post = mixer.blend(
+            Post, author=cls.user, group=cls.group, image=''
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_unchanged_pages_return_not_modified(self) -> None:
+        """Проверяет, что неизменившаяся страница отвечает 304."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'news'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+                again = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(again.status_code, 304)
+
+    def test_not_modified_skips_database_and_rendering(self) -> None:
+        """Проверяет, что 304 для ленты обходится без SQL и шаблонов,
+        а для поста — одним запросом."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        with self.assertNumQueries(1):
+            again = self.revalidate(url, response)
+        self.assertEqual(again.status_code, 304)
+        self.assertIsNone(again.context)
+
+    def test_changes_invalidate_validators(self) -> None:
+        """Проверяет, что новый пост и новый комментарий меняют ETag."""
+        index = reverse('posts:index')
+        detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        pages = {url: self.client.get(url) for url in (index, detail)}
+        mixer.blend(Post, author=self.user, image='')
+        self.assertEqual(self.revalidate(index, pages[index]).status_code, 200)
+        mixer.blend(Comment, post=self.post, author=self.user)
+        response = self.revalidate(detail, pages[detail])
+        self.assertEqual(response.status_code, 200)
+
+    def test_validators_depend_on_user(self) -> None:
+        """Проверяет, что страница гостя не подходит пользователю."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        again = self.revalidate(url, response, self.authorized_client)
+        self.assertEqual(again.status_code, 200)
+
+    def test_cache_control(self) -> None:
+        """Проверяет, что гостевые страницы разрешено кэшировать прокси,
+        а страницы пользователя — только браузеру с перепроверкой."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+class CommitInvalidationTest(TransactionTestCase):
+    def test_pages_are_bumped_again_after_commit(self) -> None:
+        """Проверяет, что версия страниц меняется и после фиксации:
+        страница, закэшированная до неё по старым данным, не отдаётся."""
+        cache.clear()
+        user = mixer.blend(User, username='auth')
+        scopes = (GLOBAL_SCOPE, 'index')
+        with transaction.atomic():
+            mixer.blend(Post, author=user, image='')
+            in_transaction = page_state(scopes)[0]
+        self.assertNotEqual(page_state(scopes)[0], in_transaction)
@@ -1,5 +1,7 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,7 +10,9 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from faker import Faker
 from mixer.backend.django import mixer
+from PIL import Image
 
+from .. import images
 from ..models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT_FORMS = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -129,6 +133,62 @@ class PostFormTests(TestCase):
         )
         self.assertEqual(Post.objects.count(), 1)
 
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_uploaded_image_is_normalized(self) -> None:
+        """Проверяет, что картинка уменьшается, теряет EXIF,
+        а её размеры сохраняются в посте."""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (400, 200), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        uploaded = SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': fake.pystr(), 'image': uploaded},
+        )
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        self.assertEqual(post.image_size, post.image.size)
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn(0x010F, image.getexif())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'width="100" height="50"')
+
+    def test_broken_image_is_rejected(self) -> None:
+        """Проверяет, что битая или слишком большая картинка даёт
+        ошибку формы, а не ошибку сервера."""
+        buffer = BytesIO()
+        Image.effect_noise((400, 200), 64).save(buffer, 'JPEG')
+        content = buffer.getvalue()
+        bomb = mock.patch.object(
+            images, 'normalize', side_effect=Image.DecompressionBombError
+        )
+        cases = (
+            ('truncated', content[:len(content) // 2], mock.MagicMock()),
+            ('bomb', content, bomb),
+        )
+        for name, data, patch in cases:
+            with self.subTest(name=name):
+                uploaded = SimpleUploadedFile(
+                    'photo.jpg', data, content_type='image/jpeg'
+                )
+                with patch:
+                    response = self.authorized_client.post(
+                        reverse('posts:post_create'),
+                        data={'text': fake.pystr(), 'image': uploaded},
+                    )
+                self.assertFormError(
+                    response, 'form', 'image', 'Не удалось обработать картинку'
+                )
+        self.assertFalse(Post.objects.exists())
+
     def test_anonym_comment_post(self) -> None:
         """Проверяет, что анонимный пользователь
         не может комментировать пост."""
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class PersonalizedPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = mixer.blend(User, username='writer')
+        cls.follower = mixer.blend(User, username='follower')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.post = mixer.blend(Post, author=cls.author, image='')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        cls.clients = {}
+        for user in (cls.author, cls.follower, cls.reader):
+            cls.clients[user.username] = Client()
+            cls.clients[user.username].force_login(user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def get(self, username, url):
+        return self.clients[username].get(url)
+
+    def test_anonymous_post_detail_is_cached(self) -> None:
+        """Проверяет, что гостю страница поста отдаётся из кэша."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+        self.assertNotContains(second, 'Добавить комментарий')
+
+    def test_users_share_page_but_get_own_header(self) -> None:
+        """Проверяет, что общая часть страницы берётся из кэша,
+        а шапка рисуется для каждого пользователя."""
+        url = reverse('posts:index')
+        self.assertContains(self.get('reader', url), 'Пользователь: reader')
+        response = self.get('follower', url)
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertContains(response, 'Пользователь: follower')
+        self.assertNotContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Избранные авторы')
+
+    def test_follow_button_is_per_user(self) -> None:
+        """Проверяет, что кнопка подписки своя у каждого пользователя."""
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        self.assertContains(self.get('reader', url), 'Подписаться')
+        response = self.get('follower', url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Отписаться')
+
+    def test_edit_link_and_comment_form_are_per_user(self) -> None:
+        """Проверяет, что ссылку на правку видит только автор,
+        а форму комментария — только вошедший пользователь."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertContains(self.get('writer', url), 'редактировать запись')
+        response = self.get('reader', url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertNotContains(response, 'редактировать запись')
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, '<!--hole:')
@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase, override_settings
 from mixer.backend.django import mixer
 
-from ..models import Group, Post
+from .. import stats
+from ..models import Comment, Follow, Group, Post, UserStats
 
 TEMP_MEDIA_ROOT_MODELS = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -40,3 +43,49 @@ class GroupModelTest(TestCase):
         """Проверяет, правильно ли отображается значение поля __str__
         в объектах модели Group"""
         self.assertEqual(self.group.title, str(self.group))
+
+
+class UserStatsModelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = mixer.blend(User, username='auth')
+        cls.reader = mixer.blend(User, username='reader')
+
+    def test_counters_follow_creates_and_deletes(self) -> None:
+        """Проверяет, что счётчики обновляются при создании
+        и удалении постов, комментариев и подписок."""
+        post = mixer.blend(Post, author=self.user)
+        comment = mixer.blend(Comment, post=post, author=self.reader)
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            stats.count_for(self.user.pk),
+            {
+                'post_count': 1,
+                'comment_count': 0,
+                'follower_count': 1,
+                'following_count': 0,
+            },
+        )
+        self.assertEqual(UserStats.objects.get(user=self.user).post_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).comment_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        follow.delete()
+        comment.delete()
+        post.delete()
+        self.assertEqual(stats.find_drift(), [])
+        self.assertEqual(UserStats.objects.get(user=self.user).post_count, 0)
+
+    def test_rebuild_stats_command_fixes_drift(self) -> None:
+        """Проверяет, что команда rebuild_stats находит
+        и исправляет расхождения."""
+        mixer.cycle(3).blend(Post, author=self.user)
+        UserStats.objects.filter(user=self.user).update(post_count=42)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', check=True, stdout=StringIO())
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.user).post_count, 3)
+        self.assertEqual(stats.find_drift(), [])
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from mixer.backend.django import mixer
+from yatube.settings import COMMENTS_PER_PAGE, NOTES_NUMBER
+
+from ..models import Comment, Follow, Group, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class PostListQueriesTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = mixer.blend(User, username='reader')
+        cls.group = mixer.blend(Group)
+        cls.author = mixer.blend(User, username='writer')
+        for _ in range(NOTES_NUMBER):
+            mixer.blend(
+                Post,
+                author=mixer.blend(User),
+                group=mixer.blend(Group),
+                image='',
+            )
+        mixer.cycle(NOTES_NUMBER).blend(
+            Post, author=cls.author, group=cls.group, image=''
+        )
+        for author in User.objects.exclude(pk=cls.user.pk):
+            Follow.objects.create(user=cls.user, author=author)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_list_pages_query_budget(self) -> None:
+        """Проверяет, что число запросов на страницах со списком постов
+        не зависит от числа постов на странице."""
+        pages = (
+            (reverse('posts:index'), 2, self.client),
+            (
+                reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+                3,
+                self.client,
+            ),
+            (
+                reverse('posts:profile', kwargs={'username': 'writer'}),
+                3,
+                self.client,
+            ),
+            (reverse('posts:follow_index'), 5, self.authorized_client),
+        )
+        for url, budget, client in pages:
+            with self.subTest(url=url):
+                self.assertQueryBudget(client, url, budget)
+
+    def test_post_detail_query_budget(self) -> None:
+        """Проверяет, что страница поста не выполняет запрос
+        на каждого автора комментария и не считает комментарии."""
+        post = Post.objects.filter(author=self.author).first()
+        for _ in range(COMMENTS_PER_PAGE + 5):
+            mixer.blend(Comment, post=post, author=mixer.blend(User))
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.assertQueryBudget(self.client, url, 2)
+        self.assertQueryBudget(
+            self.client,
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+            2,
+        )
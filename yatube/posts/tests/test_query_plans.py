@@ -0,0 +1,68 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = mixer.blend(User, username='reader')
+        cls.author = mixer.blend(User, username='writer')
+        cls.group = mixer.blend(Group)
+        mixer.cycle(15).blend(
+            Post, author=cls.author, group=cls.group, image=''
+        )
+        cls.post = Post.objects.first()
+        mixer.cycle(3).blend(Comment, post=cls.post, author=cls.user)
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_path_queries_use_indexes(self) -> None:
+        """Проверяет, что запросы страниц из posts/views.py
+        не сканируют таблицы целиком и не сортируют их."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:profile_follow', kwargs={'username': 'writer'}),
+            reverse('posts:profile_unfollow', kwargs={'username': 'writer'}),
+        )
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                for step in self.explain(sql):
+                    # Подзапрос COUNT(*) — производная таблица, а не
+                    # хранимая, её просмотр целиком ожидаем.
+                    if step.startswith('SCAN subquery'):
+                        continue
+                    with self.subTest(url=url, sql=sql, step=step):
+                        self.assertFalse(
+                            step.startswith('SCAN') and 'USING' not in step
+                        )
+                        self.assertNotIn('TEMP B-TREE FOR ORDER BY', step)
@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import resize
+
+TEMP_MEDIA_ROOT_RESIZE = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT_RESIZE)
+class ResizeTests(TestCase):
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT_RESIZE, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), 'blue').save(buffer, 'PNG')
+        self.source = default_storage.save(
+            'posts/photo.png', ContentFile(buffer.getvalue())
+        )
+
+    def url(self, size, path=None, token='0'):
+        width, height = size
+        path = path or self.source
+        try:
+            return resize.url(path, width, height)
+        except (OSError, SuspiciousFileOperation):
+            pass
+        return reverse(
+            'posts:resized_image',
+            kwargs={
+                'width': width,
+                'height': height,
+                'token': token,
+                'path': path,
+            },
+        )
+
+    def test_resized_copy_is_served_with_cache_headers(self) -> None:
+        """Проверяет, что копия отдаётся нужного размера с вечным
+        Cache-Control и отвечает 304 на повторный запрос."""
+        response = self.client.get(self.url((320, 113)))
+        self.assertEqual(response.status_code, 200)
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as im:
+            self.assertEqual(im.size, (320, 113))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        again = self.client.get(
+            self.url((320, 113)), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(again.status_code, 304)
+
+    def test_unknown_size_and_path_return_404(self) -> None:
+        """Проверяет, что размеры вне списка, отсутствующие файлы
+        и выход за MEDIA_ROOT дают 404."""
+        urls = (
+            self.url((321, 113)),
+            self.url((320, 113), 'posts/missing.png'),
+            self.url((320, 113), '../settings.py'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_concurrent_requests_generate_once(self) -> None:
+        """Проверяет, что одновременные запросы одной копии
+        готовят её один раз."""
+        original = resize.generate
+
+        def slow_generate(*args):
+            time.sleep(0.2)
+            original(*args)
+
+        paths = []
+        with mock.patch.object(
+            resize, 'generate', side_effect=slow_generate
+        ) as generate:
+            threads = [
+                threading.Thread(
+                    target=lambda: paths.append(
+                        resize.get_variant(self.source, 640, 226)[1]
+                    )
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(len(set(paths)), 1)
+
+    @override_settings(RESIZE_SENDFILE='X-Accel-Redirect')
+    def test_sendfile_header(self) -> None:
+        """Проверяет, что при RESIZE_SENDFILE файл отдаёт веб-сервер."""
+        response = self.client.get(self.url((96, 96)))
+        self.assertTrue(
+            response['X-Accel-Redirect'].startswith(
+                settings.RESIZE_ACCEL_PREFIX
+            )
+        )
+        self.assertEqual(response.content, b'')
+
+    def test_only_post_images_are_sources(self) -> None:
+        """Проверяет, что исходником может быть только картинка
+        поста, но не готовая копия и не другой файл MEDIA_ROOT."""
+        _, path, _ = resize.get_variant(self.source, 96, 96)
+        copy = os.path.relpath(path, settings.MEDIA_ROOT)
+        other = default_storage.save('other.png', ContentFile(b'x'))
+        for source in (copy, other, 'posts/../' + copy):
+            with self.subTest(source=source):
+                response = self.client.get(self.url((96, 96), source))
+                self.assertEqual(response.status_code, 404)
+
+    def test_prune_removes_old_copies(self) -> None:
+        """Проверяет, что prune_resized удаляет давно не нужные копии
+        и оставляет свежие."""
+        _, old, _ = resize.get_variant(self.source, 96, 96)
+        _, fresh, _ = resize.get_variant(self.source, 320, 113)
+        stamp = time.time() - settings.RESIZE_CACHE_TTL - 60
+        os.utime(old, (stamp, stamp))
+        call_command('prune_resized', stdout=StringIO())
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_served_copy_is_kept(self) -> None:
+        """Проверяет, что отдача старой копии продлевает ей жизнь."""
+        _, path, _ = resize.get_variant(self.source, 96, 96)
+        stamp = time.time() - settings.RESIZE_CACHE_TTL * 0.75
+        os.utime(path, (stamp, stamp))
+        self.client.get(self.url((96, 96)))
+        self.assertGreater(os.stat(path).st_mtime, time.time() - 60)
+
+    def test_changed_source_gets_new_address(self) -> None:
+        """Проверяет, что адрес копии меняется вместе с исходником,
+        а старый адрес перенаправляет на новый."""
+        old = self.url((96, 96))
+        stamp = time.time() - 3600
+        os.utime(default_storage.path(self.source), (stamp, stamp))
+        new = self.url((96, 96))
+        self.assertNotEqual(old, new)
+        self.assertRedirects(
+            self.client.get(old), new, fetch_redirect_response=False
+        )
+        self.assertFalse(new.startswith(settings.MEDIA_URL))
+
+    def test_decompression_bomb_returns_404(self) -> None:
+        """Проверяет, что слишком большая картинка даёт 404,
+        а не ошибку сервера."""
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.client.get(self.url((96, 96)))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from .. import search
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = mixer.blend(User, username='writer')
+        cls.other = mixer.blend(User, username='other')
+        cls.group = mixer.blend(Group, slug='cats')
+        cls.cat_post = Post.objects.create(
+            text='Кошки любят спать на солнце', author=cls.author,
+            group=cls.group,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собаки и кошки редко дружат', author=cls.other
+        )
+        Post.objects.create(text='Про погоду', author=cls.other)
+
+    def test_search_matches_words_and_prefixes(self) -> None:
+        """Проверяет, что поиск находит посты по словам и их началу."""
+        posts, _ = search.search('кошк')
+        self.assertCountEqual(posts, [self.cat_post, self.dog_post])
+        posts, _ = search.search('кошки спать')
+        self.assertEqual(posts, [self.cat_post])
+
+    def test_search_without_index(self) -> None:
+        """Проверяет поиск на базе без FTS5: слова ищутся через
+        icontains, посты идут от новых к старым и листаются курсором."""
+        parrots = mixer.cycle(3).blend(
+            Post, text='попугай говорит', author=self.author
+        )
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            self.assertEqual(search.search('спать')[0], [self.cat_post])
+            first, cursor = search.search('попугай говор', limit=2)
+            rest, last = search.search('попугай', cursor=cursor, limit=2)
+        self.assertEqual(first + rest, parrots[::-1])
+        self.assertIsNone(last)
+
+    def test_index_follows_post_changes(self) -> None:
+        """Проверяет, что индекс обновляется при изменении
+        и удалении поста."""
+        post = Post.objects.create(text='Хомяк', author=self.author)
+        self.assertEqual(search.search('хомяк')[0], [post])
+        post.text = 'Морская свинка'
+        post.save()
+        self.assertEqual(search.search('хомяк')[0], [])
+        self.assertEqual(search.search('свинка')[0], [post])
+        post.delete()
+        self.assertEqual(search.search('свинка')[0], [])
+
+    def test_newer_posts_rank_higher(self) -> None:
+        """Проверяет, что при равной релевантности выше свежий пост."""
+        old, new = mixer.cycle(2).blend(
+            Post, text='попугай', author=self.author
+        )
+        Post.objects.filter(pk=new.pk).update(
+            pub_date=old.pub_date - timedelta(days=30)
+        )
+        self.assertEqual(search.search('попугай')[0], [old, new])
+
+    def test_lost_triggers_are_restored(self) -> None:
+        """Проверяет, что после migrate пропавшие триггеры
+        создаются заново, а индекс перестраивается."""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        post = Post.objects.create(text='Черепаха', author=self.author)
+        self.assertEqual(search.search('черепаха')[0], [])
+        search.ensure_triggers()
+        self.assertEqual(search.search('черепаха')[0], [post])
+        other = Post.objects.create(text='Черепаха', author=self.other)
+        self.assertEqual(len(search.search('черепаха')[0]), 2)
+        self.assertIn(other, search.search('черепаха')[0])
+
+    def test_filters_by_group_and_author(self) -> None:
+        """Проверяет фильтры по группе и автору."""
+        self.assertEqual(
+            search.search('кошки', group=self.group)[0], [self.cat_post]
+        )
+        self.assertEqual(
+            search.search('кошки', author=self.other)[0], [self.dog_post]
+        )
+
+    def test_cursor_walks_all_results(self) -> None:
+        """Проверяет, что курсор проходит все результаты без повторов."""
+        mixer.cycle(5).blend(Post, text='котики', author=self.author)
+        seen, cursor = [], None
+        while True:
+            posts, cursor = search.search('котики', cursor=cursor, limit=2)
+            seen.extend(posts)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_operators_in_query_are_ignored(self) -> None:
+        """Проверяет, что синтаксис FTS5 во вводе не ломает запрос."""
+        self.assertEqual(search.search('"кошки" OR (NEAR')[0], [])
+        self.assertEqual(search.search('***')[0], [])
+
+    def test_search_page(self) -> None:
+        """Проверяет страницу поиска с фильтром по автору."""
+        response = Client().get(
+            reverse('posts:search'), {'q': 'кошки', 'author': 'writer'}
+        )
+        self.assertEqual(list(response.context['posts']), [self.cat_post])
+        self.assertContains(response, 'Кошки любят спать')
+
+    def test_admin_uses_index(self) -> None:
+        """Проверяет, что поиск в админке идёт через индекс."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog_post]
+        )
@@ -0,0 +1,227 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+from sorl.thumbnail import get_thumbnail
+
+from .. import thumbnails
+from .. import cache as page_cache
+from ..models import Post, ThumbnailJob
+
+TEMP_MEDIA_ROOT_THUMBNAILS = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT_THUMBNAILS)
+class ThumbnailJobTests(TransactionTestCase):
+    # Задача ставится в очередь после фиксации транзакции.
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT_THUMBNAILS, ignore_errors=True)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = mixer.blend(User, username='auth')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self):
+        uploaded = SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст', 'image': uploaded},
+        )
+        return Post.objects.get()
+
+    def test_upload_queues_job_and_shows_original(self) -> None:
+        """Проверяет, что загрузка картинки ставит задачу в очередь,
+        а страница до её выполнения показывает исходную картинку."""
+        post = self.create_post()
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.source, post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, post.image.url)
+
+    def test_worker_stores_thumbnail(self) -> None:
+        """Проверяет, что после обработки очереди страницы
+        показывают готовую миниатюру."""
+        post = self.create_post()
+        self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(thumbnails.run_once(), 1)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertEqual(
+            ThumbnailJob.objects.get().status, ThumbnailJob.DONE
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.thumbnail_url)
+
+    def test_page_lists_thumbnail_variants(self) -> None:
+        """Проверяет, что страница выводит srcset из всех вариантов,
+        найденных одним обращением к хранилищу ключей."""
+        post = self.create_post()
+        thumbnails.run_once()
+        post.refresh_from_db()
+        found = thumbnails.variants(post.image.name)
+        self.assertEqual(
+            [variant.width for variant in found],
+            list(settings.POST_THUMBNAIL_WIDTHS),
+        )
+        self.assertEqual(found[-1].name, post.thumbnail)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.variants(post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        for variant in found:
+            self.assertContains(response, f'{variant.url} {variant.width}w')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_page_resolves_thumbnails_in_one_query(self) -> None:
+        """Проверяет, что варианты миниатюр всех постов страницы
+        ищутся одним запросом к хранилищу ключей sorl."""
+        for _ in range(3):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'Текст',
+                    'image': SimpleUploadedFile(
+                        'small.gif', SMALL_GIF, content_type='image/gif'
+                    ),
+                },
+            )
+        thumbnails.run_once()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        lookups = [
+            query for query in queries if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertContains(response, 'srcset=', count=3)
+
+    def test_retried_upload_leaves_no_orphan_file(self) -> None:
+        """Проверяет, что повтор транзакции удаляет картинку,
+        сохранённую неудачной попыткой."""
+        save, saved = Post.save, []
+
+        def locked_once(post, *args, **kwargs):
+            save(post, *args, **kwargs)
+            saved.append(post.image.name)
+            if len(saved) == 1:
+                raise OperationalError('database is locked')
+
+        with mock.patch.object(Post, 'save', locked_once):
+            post = self.create_post()
+        self.assertEqual(post.image.name, saved[1])
+        self.assertFalse(default_storage.exists(saved[0]))
+        self.assertTrue(default_storage.exists(saved[1]))
+
+    def test_replacing_image_requeues_thumbnail(self) -> None:
+        """Проверяет, что новая картинка сбрасывает старую миниатюру."""
+        post = self.create_post()
+        thumbnails.run_once()
+        uploaded = SimpleUploadedFile(
+            name='other.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Текст', 'image': uploaded},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+        self.assertEqual(
+            ThumbnailJob.objects.filter(status=ThumbnailJob.PENDING).count(),
+            1,
+        )
+
+    def test_thumbnail_changes_invalidate_pages(self) -> None:
+        """Проверяет, что сброс миниатюры и готовая миниатюра
+        поднимают версии страниц с постом, а сброс меняет updated,
+        по которому кэшируется карточка поста."""
+        post = self.create_post()
+
+        def version():
+            return page_cache.page_state(page_cache.post_scopes(post))[0]
+
+        before = version()
+        thumbnails.run_once()
+        after_render = version()
+        self.assertNotEqual(after_render, before)
+        post.refresh_from_db()
+        rendered = post.updated
+        thumbnails.enqueue(post)
+        self.assertNotEqual(version(), after_render)
+        post.refresh_from_db()
+        self.assertGreater(post.updated, rendered)
+
+    @override_settings(THUMBNAIL_JOB_ATTEMPTS=2)
+    def test_missing_source_fails_after_attempts(self) -> None:
+        """Проверяет, что задача с пропавшей картинкой повторяется
+        и помечается ошибочной."""
+        post = mixer.blend(Post, author=self.user, image='posts/missing.jpg')
+        thumbnails.enqueue(post)
+        with self.assertLogs('sorl.thumbnail', level='ERROR'):
+            call_command(
+                'thumbnail_worker', once=True, workers=0, stdout=StringIO()
+            )
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.status, ThumbnailJob.FAILED)
+        self.assertEqual(job.attempts, 2)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT_THUMBNAILS)
+class SorlNamesTests(TestCase):
+    def test_variant_names_match_sorl(self) -> None:
+        """Проверяет, что variant_file вычисляет те же имена, что
+        и get_thumbnail: модуль повторяет внутреннюю логику sorl,
+        и тест упадёт, если она изменится."""
+        source = default_storage.save(
+            'posts/names.gif', ContentFile(SMALL_GIF)
+        )
+        for geometry in thumbnails.geometries():
+            with self.subTest(geometry=geometry):
+                thumbnail = get_thumbnail(
+                    source, geometry, **settings.POST_THUMBNAIL_OPTIONS
+                )
+                self.assertEqual(
+                    thumbnails.variant_file(source, geometry).name,
+                    thumbnail.name,
+                )
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from .. import stats
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = mixer.blend(User, username='writer')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend(Group, slug='news')
+        cls.posts = mixer.cycle(3).blend(
+            Post, author=cls.author, group=cls.group, image=''
+        )
+        cls.old_date = timezone.now() - timedelta(days=100)
+        Post.objects.filter(pk=cls.posts[0].pk).update(pub_date=cls.old_date)
+        mixer.cycle(2).blend(Comment, post=cls.posts[0], author=cls.reader)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def export(self, kind, fmt):
+        path = os.path.join(self.directory, f'{kind}.{fmt}')
+        call_command(
+            'export_posts', kind, output=path, format=fmt, stderr=StringIO()
+        )
+        return path
+
+    def import_(self, kind, path, **options):
+        call_command('import_posts', kind, path, stdout=StringIO(), **options)
+
+    def round_trip(self, fmt):
+        paths = {
+            kind: self.export(kind, fmt)
+            for kind in ('posts', 'comments', 'follows')
+        }
+        expected = list(
+            Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug'
+            )
+        )
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        for kind, path in paths.items():
+            self.import_(kind, path)
+        self.assertEqual(
+            list(
+                Post.objects.order_by('pk').values_list(
+                    'pk', 'text', 'pub_date', 'author__username',
+                    'group__slug',
+                )
+            ),
+            expected,
+        )
+
+    def test_jsonl_round_trip_keeps_dates_and_rebuilds(self) -> None:
+        """Проверяет, что выгрузка и загрузка JSONL сохраняют посты
+        с датами, а после загрузки пересчитаны счётчики и ленты."""
+        self.round_trip('jsonl')
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[0].pk).comment_count, 2
+        )
+        self.assertEqual(stats.find_drift(), [])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_csv_round_trip(self) -> None:
+        """Проверяет выгрузку и загрузку в CSV."""
+        self.round_trip('csv')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_unknown_authors_are_skipped_or_created(self) -> None:
+        """Проверяет, что записи неизвестных авторов пропускаются,
+        а с --create-users авторы создаются."""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('{"author": "ghost", "text": "Привет"}\n')
+        self.import_('posts', path)
+        self.assertFalse(Post.objects.filter(text='Привет').exists())
+        self.import_('posts', path, create_users=True)
+        post = Post.objects.get(text='Привет')
+        self.assertEqual(post.author.username, 'ghost')
+        self.assertFalse(post.author.has_usable_password())
+
+    def test_import_is_batched(self) -> None:
+        """Проверяет, что число запросов растёт с числом пачек,
+        а не записей."""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            for number in range(50):
+                stream.write(f'{{"author": "writer", "text": "{number}"}}\n')
+        with self.assertNumQueries(11):
+            self.import_('posts', path, batch_size=25, skip_rebuild=True)
+        self.assertEqual(Post.objects.count(), 53)
+
+    def test_duplicate_id_is_reported(self) -> None:
+        """Проверяет, что пост с уже занятым id останавливает импорт
+        ошибкой команды с этим id, а даты сохраняются из файла."""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(
+                '{"id": 1000, "author": "writer", "text": "Новый", '
+                '"pub_date": "2020-01-02T03:04:05+00:00"}\n'
+                '{"author": "writer", "text": "Без id", '
+                '"pub_date": "2019-01-02T03:04:05+00:00"}\n'
+            )
+        self.import_('posts', path, skip_rebuild=True)
+        post = Post.objects.get(pk=1000)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.updated, post.pub_date)
+        self.assertEqual(Post.objects.get(text='Без id').pub_date.year, 2019)
+        with self.assertRaisesRegex(CommandError, 'id 1000'):
+            self.import_('posts', path, skip_rebuild=True)
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase
+from mixer.backend.django import mixer
+
+from ..models import Post
+from ..utils import ELLIPSIS, KeysetPaginator, elided_page_range
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = mixer.blend(User, username='auth')
+        mixer.cycle(25).blend(Post, author=cls.user)
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_cursor_pages_match_offset_pages(self) -> None:
+        """Проверяет, что переход по курсорам выдаёт те же страницы,
+        что и переход по номерам."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(1)
+        pages = [page.object_list]
+        while page.next_cursor:
+            page = paginator.get_page(None, page.next_cursor)
+            pages.append(page.object_list)
+        self.assertEqual(pages[0], self.expected[:10])
+        self.assertEqual(pages[1], self.expected[10:20])
+        self.assertEqual(pages[2], self.expected[20:])
+        self.assertEqual(page.number, 3)
+
+    def test_previous_cursor_returns_previous_page(self) -> None:
+        """Проверяет переход на предыдущую страницу по курсору."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        third = paginator.get_page(3)
+        second = paginator.get_page(None, third.previous_cursor)
+        first = paginator.get_page(None, second.previous_cursor)
+        self.assertEqual(second.object_list, self.expected[10:20])
+        self.assertEqual(second.number, 2)
+        self.assertEqual(first.object_list, self.expected[:10])
+        self.assertFalse(first.has_previous())
+
+    def test_cursor_page_skips_offset(self) -> None:
+        """Проверяет, что страница по курсору строится одним запросом
+        без подсчёта и OFFSET."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page(2).next_cursor
+        with self.assertNumQueries(1) as queries:
+            paginator.get_page(None, cursor)
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+
+    def test_last_cursor_reads_tail_without_offset(self) -> None:
+        """Проверяет, что ссылка на последнюю страницу идёт по курсору
+        без OFFSET и возвращает хвост списка."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page(1).last_cursor
+        with self.assertNumQueries(1) as queries:
+            last = paginator.get_page(None, cursor)
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+        self.assertEqual(last.object_list, self.expected[20:])
+        self.assertEqual(last.number, 3)
+        self.assertFalse(last.has_next())
+        second = paginator.get_page(None, last.previous_cursor)
+        self.assertEqual(second.object_list, self.expected[10:20])
+
+    def test_last_cursor_with_stale_count(self) -> None:
+        """Проверяет, что при устаревшем счётчике последняя страница
+        всё равно содержит последние посты, а не пустую страницу."""
+        paginator = KeysetPaginator(Post.objects.all(), 10, count=12)
+        last = paginator.get_page(None, paginator.first_page().last_cursor)
+        self.assertEqual(last.object_list, self.expected[-2:])
+        self.assertTrue(last.has_previous())
+
+    def test_invalid_cursor_falls_back_to_page_number(self) -> None:
+        """Проверяет, что повреждённый курсор не ломает страницу."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(2, 'not-a-cursor')
+        self.assertEqual(page.object_list, self.expected[10:20])
+
+    def test_approximate_count_is_cached(self) -> None:
+        """Проверяет, что приблизительный счётчик не выполняет COUNT
+        на каждый запрос."""
+        KeysetPaginator(Post.objects.all(), 10, approximate_count=True).count
+        paginator = KeysetPaginator(
+            Post.objects.all(), 10, approximate_count=True
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, len(self.expected))
+
+
+class ElidedPageRangeTest(SimpleTestCase):
+    def test_window_around_current_page(self) -> None:
+        """Проверяет, что выдаются края и окно вокруг текущей страницы."""
+        cases = {
+            (1, 5): [1, 2, 3, 4, 5],
+            (1, 100): [1, 2, 3, ELLIPSIS, 100],
+            (50, 100): [1, ELLIPSIS, 48, 49, 50, 51, 52, ELLIPSIS, 100],
+            (97, 100): [1, ELLIPSIS, 95, 96, 97, 98, 99, 100],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(
+                    list(elided_page_range(number, num_pages)), expected
+                )
+
+
+class PaginatorTemplateTest(TestCase):
+    def test_huge_page_count_renders_few_links(self) -> None:
+        """Проверяет, что при миллионах страниц выводится лишь окно."""
+        mixer.cycle(11).blend(Post, author=mixer.blend(User))
+        paginator = KeysetPaginator(Post.objects.all(), 10, count=10 ** 7)
+        html = render_to_string(
+            'posts/includes/paginator.html', {'page_obj': paginator.page(2)}
+        )
+        self.assertLess(html.count('class="page-item'), 15)
+        self.assertIn('?page=1000000"', html)
@@ -1,16 +1,20 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from mixer.backend.django import mixer
-from yatube.settings import NOTES_NUMBER
+from yatube.settings import COMMENTS_PER_PAGE, NOTES_NUMBER
 
-from ..models import Comment, Follow, Group, Post
+from .. import cache as page_cache
+from ..models import Comment, FeedEntry, Follow, Group, Post
 
 TEMP_MEDIA_ROOT_VIEWS = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -214,15 +218,100 @@ class PostViewsTest(TestCase):
         expected = Comment.objects.get(author=self.user)
         self.assertEqual(response.context.get('comments')[0], expected)
 
-    def test_cache_index(self) -> None:
-        """Проверяет работу кэша."""
-        cached_response = self.authorized_client.get(reverse('posts:index'))
-        mixer.blend(Post, author=self.user)
-        response1 = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response1.content, cached_response.content)
-        cache.clear()
-        response2 = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(response2.content, cached_response.content)
+    def test_comments_are_paginated_by_cursor(self) -> None:
+        """Проверяет, что комментарии выводятся страницами,
+        а следующие отдаются в JSON по курсору."""
+        post = mixer.blend(Post, author=self.user)
+        comments = mixer.cycle(COMMENTS_PER_PAGE + 3).blend(
+            Comment, post=post, author=self.user
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        page = self.client.get(url).context['comments']
+        self.assertEqual(list(page), comments[:COMMENTS_PER_PAGE])
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+            {'cursor': page.next_cursor},
+        )
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in comments[COMMENTS_PER_PAGE:]],
+        )
+        self.assertIsNone(data['next_cursor'])
+        newest = self.client.get(url, {'order': 'newest'}).context
+        self.assertEqual(newest['comments'][0], comments[-1])
+
+    def test_card_shows_comment_count(self) -> None:
+        """Проверяет, что карточка поста показывает свежий
+        счётчик комментариев."""
+        self.client.get(reverse('posts:index'))
+        mixer.cycle(2).blend(Comment, post=self.post, author=self.user)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 2)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 2')
+        Comment.objects.first().delete()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+
+    def test_index_is_cached_until_content_changes(self) -> None:
+        """Проверяет, что главная страница отдаётся из кэша
+        и сбрасывается сразу после появления нового поста."""
+        self.assertIsNotNone(
+            self.client.get(reverse('posts:index')).context
+        )
+        self.assertIsNone(self.client.get(reverse('posts:index')).context)
+        post = mixer.blend(Post, author=self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn(post, response.context.get('page_obj').object_list)
+
+    def test_group_page_is_refreshed_on_comment(self) -> None:
+        """Проверяет, что комментарий сбрасывает кэш страниц поста."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        mixer.blend(Comment, post=self.post, author=self.user)
+        self.assertIsNotNone(self.client.get(url).context)
+
+    def test_stale_page_is_served_while_locked(self) -> None:
+        """Проверяет, что пока другой процесс пересчитывает страницу,
+        отдаётся её предыдущая версия."""
+        self.client.get(reverse('posts:index'))
+        post = mixer.blend(Post, author=self.user)
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        key, _ = page_cache._page_key(
+            'index', (page_cache.GLOBAL_SCOPE, 'index'), request
+        )
+        cache.add(f'{key}:lock', 1)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNone(response.context)
+        self.assertNotContains(response, post.text)
+
+    def test_post_card_is_cached(self) -> None:
+        """Проверяет, что карточка поста берётся из кэша, пока пост
+        не изменён."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Новый текст')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Исправленный текст', 'group': self.group.id},
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_post_card_follows_group_and_author_changes(self) -> None:
+        """Проверяет, что карточка обновляется при смене слага группы
+        и имени автора."""
+        self.client.get(reverse('posts:index'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed-group'
+        group.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Переименованный'
+        author.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '/group/renamed-group/')
+        self.assertContains(response, 'Переименованный')
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT_VIEWS)
@@ -284,3 +373,52 @@ class FollowViewsTest(TestCase):
         self.assertNotIn(
             post, response_not_follow.context.get('page_obj').object_list
         )
+
+    def test_follow_backfills_feed(self) -> None:
+        """Проверяет, что при подписке старые посты автора попадают
+        в ленту, а при отписке удаляются из неё."""
+        self.authorized_client.post(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=self.post).exists()
+        )
+        self.authorized_client.post(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(FEED_CELEBRITY_THRESHOLD=0)
+    def test_celebrity_posts_are_read_on_demand(self) -> None:
+        """Проверяет, что посты автора с большим числом подписчиков
+        не раскладываются по лентам, но видны в ленте подписки."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = mixer.blend(Post, author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertIn(post, response.context.get('page_obj').object_list)
+
+    @override_settings(
+        FEED_CELEBRITY_THRESHOLD=1, FEED_FOLLOWERS_BACKFILL_LIMIT=1
+    )
+    def test_former_celebrity_backfill_is_capped(self) -> None:
+        """Проверяет, что когда автор перестаёт быть знаменитостью,
+        подписчики получают в ленту не больше заданного числа постов,
+        а rebuild_feeds возвращает остальные."""
+        reader = mixer.blend(User)
+        mixer.cycle(3).blend(Post, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        with self.assertLogs('yatube.feed', 'INFO'):
+            Follow.objects.get(user=reader, author=self.author).delete()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 1
+        )
+        call_command(
+            'rebuild_feeds', authors=[self.author.username], stdout=StringIO()
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(),
+            Post.objects.filter(author=self.author).count(),
+        )
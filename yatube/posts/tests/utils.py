@@ -0,0 +1,18 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что страница укладывается в заданное число запросов."""
+
+    def assertQueryBudget(self, client, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        executed = [query['sql'] for query in queries.captured_queries]
+        self.assertLessEqual(
+            len(executed),
+            budget,
+            f'{url} выполнила {len(executed)} запросов '
+            f'вместо {budget}:\n' + '\n'.join(executed),
+        )
+        return response
@@ -0,0 +1,243 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+При загрузке картинки в post_create/post_edit создаётся ThumbnailJob,
+а команда `thumbnail_worker` раздаёт задачи пулу процессов. Пока
+миниатюра не готова, шаблоны показывают исходную картинку, поэтому
+ни один запрос страницы не сжимает изображения сам.
+
+Воркер готовит несколько вариантов миниатюры по ширинам
+POST_THUMBNAIL_WIDTHS с пропорциями POST_THUMBNAIL_GEOMETRY. Имена
+вариантов sorl вычисляет из имени картинки и параметров, поэтому
+страница находит готовые варианты всех своих постов одним обращением
+к хранилищу ключей (см. prefetch и variants), ничего не сжимая.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache as page_cache
+from .models import Post, ThumbnailJob
+
+
+def enqueue(post):
+    """Ставит в очередь миниатюру для текущей картинки поста.
+
+    update() не отправляет сигналов, поэтому страницы со старой
+    миниатюрой сбрасываются здесь, а updated меняется ради карточек
+    постов, которые кэшируются по нему.
+    """
+    if post.thumbnail:
+        post.updated = timezone.now()
+        Post.objects.filter(pk=post.pk).update(
+            thumbnail='', updated=post.updated
+        )
+        post.thumbnail = ''
+        page_cache.bump_on_commit(*page_cache.post_scopes(post))
+    if not post.image:
+        return None
+    return ThumbnailJob.objects.create(post=post, source=post.image.name)
+
+
+def geometries():
+    """Размеры вариантов миниатюры по возрастанию ширины."""
+    width, height = map(int, settings.POST_THUMBNAIL_GEOMETRY.split('x'))
+    sizes = {
+        f'{variant}x{round(variant * height / width)}'
+        for variant in settings.POST_THUMBNAIL_WIDTHS
+    }
+    sizes.add(settings.POST_THUMBNAIL_GEOMETRY)
+    return sorted(sizes, key=lambda size: int(size.split('x')[0]))
+
+
+def variant_file(source, geometry):
+    """Файл миниатюры, который get_thumbnail создал бы для source.
+
+    Параметры дополняются так же, как в ThumbnailBackend.get_thumbnail,
+    чтобы имя совпало с именем готовой миниатюры.
+    """
+    backend = default.backend
+    image = ImageFile(source)
+    options = dict(settings.POST_THUMBNAIL_OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(image))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, name in backend.extra_options:
+        value = getattr(sorl_settings, name)
+        if value != getattr(sorl_defaults, name):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(image, geometry, options),
+        default.storage,
+    )
+
+
+def lookup(sources):
+    """Готовые варианты миниатюр для нескольких картинок сразу.
+
+    Возвращает {картинка: варианты по возрастанию ширины}; все
+    варианты всех картинок ищутся одним обращением к хранилищу ключей.
+    """
+    files = {
+        source: [variant_file(source, geometry) for geometry in geometries()]
+        for source in sources
+    }
+    found = default.kvstore.get_many(
+        [image for images in files.values() for image in images]
+    )
+    return {
+        source: [found[image.key] for image in images if image.key in found]
+        for source, images in files.items()
+    }
+
+
+def prefetch(request, posts):
+    """Запоминает картинки постов страницы до её отрисовки.
+
+    Первый же вызов variants() с этим запросом найдёт варианты всех
+    запомненных картинок разом, так что страница стоит одно обращение
+    к хранилищу ключей, сколько бы на ней ни было постов. Если карточки
+    постов взяты из кэша, обращения не будет вовсе.
+    """
+    memo = request.__dict__.setdefault('_thumbnails', {})
+    pending = request.__dict__.setdefault('_thumbnails_pending', set())
+    pending.update(
+        post.image.name
+        for post in posts
+        if post.thumbnail and post.image and post.image.name not in memo
+    )
+
+
+def variants(source, request=None):
+    """Готовые варианты миниатюры source по возрастанию ширины.
+
+    С запросом результат берётся из найденного для всей страницы
+    (см. prefetch), без него — ищется одним обращением к хранилищу.
+    """
+    if request is None:
+        return lookup([source])[source]
+    memo = request.__dict__.setdefault('_thumbnails', {})
+    pending = request.__dict__.setdefault('_thumbnails_pending', set())
+    if source not in memo:
+        pending.add(source)
+        memo.update(lookup(pending))
+        pending.clear()
+    return memo[source]
+
+
+def render(source):
+    """Сжимает картинку во всех размерах и возвращает имя основной
+    миниатюры (POST_THUMBNAIL_GEOMETRY) в хранилище.
+
+    Выполняется в процессе пула, поэтому не трогает базу напрямую:
+    sorl сам сохраняет файлы и записи в своём хранилище ключей.
+    """
+    main = None
+    for geometry in geometries():
+        thumbnail = get_thumbnail(
+            source, geometry, **settings.POST_THUMBNAIL_OPTIONS
+        )
+        # sorl не бросает исключение, если исходник не открылся.
+        if not thumbnail.exists():
+            raise FileNotFoundError(f'Не удалось сжать картинку {source}')
+        if geometry == settings.POST_THUMBNAIL_GEOMETRY:
+            main = thumbnail
+    return main.name
+
+
+def claim(limit):
+    """Забирает до limit задач из очереди.
+
+    Задача переводится в RUNNING условным UPDATE, поэтому несколько
+    воркеров не возьмут её дважды. Зависшие в RUNNING дольше
+    THUMBNAIL_JOB_TIMEOUT секунд задачи возвращаются в работу.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.THUMBNAIL_JOB_TIMEOUT)
+    ThumbnailJob.objects.filter(
+        status=ThumbnailJob.RUNNING, updated__lt=stale
+    ).update(status=ThumbnailJob.PENDING)
+    candidates = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING
+    ).values_list('pk', flat=True)[:limit]
+    jobs = []
+    for pk in candidates:
+        claimed = ThumbnailJob.objects.filter(
+            pk=pk, status=ThumbnailJob.PENDING
+        ).update(status=ThumbnailJob.RUNNING, updated=timezone.now())
+        if claimed:
+            jobs.append(ThumbnailJob.objects.get(pk=pk))
+    return jobs
+
+
+def complete(job, name):
+    """Сохраняет готовую миниатюру и сбрасывает кэш страниц с постом."""
+    with transaction.atomic():
+        post = (
+            Post.objects.select_related('author', 'group')
+            .filter(pk=job.post_id, image=job.source)
+            .first()
+        )
+        # Картинку могли заменить, пока задача ждала в очереди.
+        if post is not None:
+            Post.objects.filter(pk=post.pk).update(
+                thumbnail=name, updated=timezone.now()
+            )
+            scopes = page_cache.post_scopes(post)
+            transaction.on_commit(lambda: page_cache.bump(*scopes))
+        job.status = ThumbnailJob.DONE
+        job.error = ''
+        job.save(update_fields=('status', 'error', 'updated'))
+
+
+def fail(job, error):
+    job.attempts += 1
+    job.error = str(error)
+    job.status = (
+        ThumbnailJob.FAILED
+        if job.attempts >= settings.THUMBNAIL_JOB_ATTEMPTS
+        else ThumbnailJob.PENDING
+    )
+    job.save(update_fields=('attempts', 'error', 'status', 'updated'))
+
+
+def run_once(pool=None, limit=None):
+    """Обрабатывает одну порцию задач и возвращает их число.
+
+    Без пула миниатюры готовятся в текущем процессе.
+    """
+    jobs = claim(limit or settings.THUMBNAIL_JOB_BATCH)
+    if not jobs:
+        return 0
+    if pool is None:
+        results = [_attempt(render, job.source) for job in jobs]
+    else:
+        futures = [pool.submit(render, job.source) for job in jobs]
+        results = [_attempt(future.result) for future in futures]
+    for job, (name, error) in zip(jobs, results):
+        if error is None:
+            complete(job, name)
+        else:
+            fail(job, error)
+    return len(jobs)
+
+
+def worker_pool(workers=None):
+    # Дочерние процессы не должны наследовать открытые соединения.
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=workers or settings.THUMBNAIL_WORKERS
+    )
+
+
+def _attempt(func, *args):
+    try:
+        return func(*args), None
+    except Exception as error:
+        return None, error
@@ -0,0 +1,283 @@
+"""Массовый импорт и экспорт постов, комментариев и подписок.
+
+Записи читаются и пишутся потоком в JSONL или CSV, по одному виду
+записей на файл. Импорт идёт пачками через bulk_create, каждая пачка —
+в своей транзакции; пачка с уже занятым id останавливает импорт
+с указанием этого id. Авторов и группы ищем по username и slug через
+словари, которые дополняются одним запросом на пачку. bulk_create не
+отправляет сигналы, поэтому после импорта счётчики и ленты
+пересчитываются целиком (см. finish_import).
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache as page_cache
+from . import feed, stats
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+KINDS = {
+    'posts': (
+        Post,
+        ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+        {'author': 'author__username', 'group': 'group__slug'},
+    ),
+    'comments': (
+        Comment,
+        ('id', 'post', 'author', 'text', 'created'),
+        {'post': 'post_id', 'author': 'author__username'},
+    ),
+    'follows': (
+        Follow,
+        ('user', 'author'),
+        {'user': 'user__username', 'author': 'author__username'},
+    ),
+}
+FORMATS = ('jsonl', 'csv')
+
+
+class TransferError(Exception):
+    pass
+
+
+def export_rows(kind, batch_size):
+    """Отдаёт записи вида kind словарями, читая таблицу порциями."""
+    model, fields, sources = KINDS[kind]
+    columns = [sources.get(field, field) for field in fields]
+    rows = model.objects.order_by('pk').values_list(*columns)
+    for row in rows.iterator(chunk_size=batch_size):
+        yield {
+            field: value.isoformat() if hasattr(value, 'isoformat') else value
+            for field, value in zip(fields, row)
+        }
+
+
+def write_rows(rows, stream, fmt, fields):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+        return
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield row
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value or None for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def date_fields(model):
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+        or getattr(field, 'auto_now', False)
+    ]
+
+
+def bulk_create_dated(model, objects, batch_size=None):
+    """bulk_create, который сохраняет даты объектов.
+
+    auto_now_add и auto_now перезаписывают их временем вставки, поэтому
+    даты ставятся отдельным bulk_update после неё. SQLite не возвращает
+    pk из bulk_create: объекты без pk вставляются последними, и раз
+    запись держит базу до конца транзакции, их pk — самые большие.
+    """
+    fields = date_fields(model)
+    dates = [
+        [getattr(obj, field.attname) for field in fields] for obj in objects
+    ]
+    known = [obj for obj in objects if obj.pk is not None]
+    new = [obj for obj in objects if obj.pk is None]
+    with transaction.atomic():
+        model.objects.bulk_create(known, batch_size=batch_size)
+        model.objects.bulk_create(new, batch_size=batch_size)
+        if new and new[0].pk is None:
+            pks = model.objects.order_by('-pk').values_list('pk', flat=True)
+            for obj, pk in zip(new, reversed(list(pks[:len(new)]))):
+                obj.pk = pk
+        for obj, values in zip(objects, dates):
+            for field, value in zip(fields, values):
+                setattr(obj, field.attname, value)
+        if fields and objects:
+            model.objects.bulk_update(
+                objects,
+                [field.name for field in fields],
+                batch_size=batch_size,
+            )
+    return objects
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise TransferError(f'Некорректная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Importer:
+    """Загружает пачки записей одного вида и считает результат."""
+
+    def __init__(self, kind, create_users=False):
+        self.kind = kind
+        self.create_users = create_users
+        self.users = {}
+        self.groups = {}
+        self.posts = set()
+        self.created = 0
+        self.skipped = 0
+
+    def resolve_users(self, usernames):
+        missing = {name for name in usernames if name} - self.users.keys()
+        if not missing:
+            return
+        self.users.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'pk'
+            )
+        )
+        unknown = missing - self.users.keys()
+        if unknown and self.create_users:
+            User.objects.bulk_create(
+                [User(username=name, password='!') for name in unknown]
+            )
+            self.users.update(
+                User.objects.filter(username__in=unknown).values_list(
+                    'username', 'pk'
+                )
+            )
+
+    def resolve_groups(self, slugs):
+        missing = {slug for slug in slugs if slug} - self.groups.keys()
+        if missing:
+            self.groups.update(
+                Group.objects.filter(slug__in=missing).values_list(
+                    'slug', 'pk'
+                )
+            )
+
+    def resolve_posts(self, ids):
+        missing = {int(pk) for pk in ids if pk} - self.posts
+        if missing:
+            self.posts.update(
+                Post.objects.filter(pk__in=missing).values_list(
+                    'pk', flat=True
+                )
+            )
+
+    def build_posts(self, rows):
+        self.resolve_users(row['author'] for row in rows)
+        self.resolve_groups(row.get('group') for row in rows)
+        for row in rows:
+            author_id = self.users.get(row['author'])
+            group = row.get('group')
+            if author_id is None or (group and group not in self.groups):
+                self.skipped += 1
+                continue
+            pub_date = parse_date(row.get('pub_date'))
+            yield Post(
+                pk=row.get('id') or None,
+                author_id=author_id,
+                group_id=self.groups.get(group),
+                text=row['text'],
+                pub_date=pub_date,
+                updated=pub_date,
+                image=row.get('image') or '',
+            )
+
+    def build_comments(self, rows):
+        self.resolve_users(row['author'] for row in rows)
+        self.resolve_posts(row['post'] for row in rows)
+        for row in rows:
+            author_id = self.users.get(row['author'])
+            if author_id is None or int(row['post']) not in self.posts:
+                self.skipped += 1
+                continue
+            yield Comment(
+                pk=row.get('id') or None,
+                post_id=row['post'],
+                author_id=author_id,
+                text=row['text'],
+                created=parse_date(row.get('created')),
+            )
+
+    def build_follows(self, rows):
+        self.resolve_users(
+            name for row in rows for name in (row['user'], row['author'])
+        )
+        for row in rows:
+            user_id = self.users.get(row['user'])
+            author_id = self.users.get(row['author'])
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skipped += 1
+                continue
+            yield Follow(user_id=user_id, author_id=author_id)
+
+    def load(self, rows):
+        model = KINDS[self.kind][0]
+        objects = list(getattr(self, f'build_{self.kind}')(rows))
+        try:
+            if self.kind == 'follows':
+                model.objects.bulk_create(objects, ignore_conflicts=True)
+            else:
+                bulk_create_dated(model, objects)
+        except IntegrityError as error:
+            raise TransferError(self.conflict(model, objects) or str(error))
+        self.created += len(objects)
+        return len(objects)
+
+    def conflict(self, model, objects):
+        """Описывает запись, из-за которой пачка не вставилась."""
+        seen = set()
+        for obj in objects:
+            if obj.pk in seen:
+                return f'{self.kind}: id {obj.pk} повторяется в файле'
+            if obj.pk is not None:
+                seen.add(obj.pk)
+        for pks in chunks(sorted(seen), 500):
+            existing = (
+                model.objects.filter(pk__in=pks)
+                .order_by('pk')
+                .values_list('pk', flat=True)
+                .first()
+            )
+            if existing is not None:
+                return f'{self.kind}: id {existing} уже есть в базе'
+        return None
+
+
+def finish_import():
+    """Пересчитывает то, что при импорте не обновили сигналы."""
+    stats.rebuild_all()
+    stats.rebuild_comment_counts()
+    feed.rebuild()
+    page_cache.bump(page_cache.GLOBAL_SCOPE)
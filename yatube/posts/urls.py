@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -14,7 +14,13 @@ urlpatterns = [
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_posts, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -25,4 +31,29 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow',
     ),
+    path('api/posts/', api.post_list, name='api_posts'),
+    path(
+        'api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'
+    ),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_post_comments',
+    ),
+    path(
+        'api/group/<slug:slug>/posts/',
+        api.group_posts,
+        name='api_group_posts',
+    ),
+    path(
+        'api/profile/<str:username>/posts/',
+        api.profile_posts,
+        name='api_profile_posts',
+    ),
+    path('api/follow/posts/', api.follow_posts, name='api_follow_posts'),
+    path(
+        'resize/<int:width>x<int:height>/<str:token>/<path:path>',
+        views.resized_image,
+        name='resized_image',
+    ),
 ]
@@ -1,8 +1,253 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import json
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-def connect_paginator(request, object, page_number):
-    paginator = Paginator(object, page_number)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+
+ELLIPSIS = '…'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def elided_page_range(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+
+    Выдаёт не больше 2 * (on_each_side + on_ends) + 3 значений, сколько
+    бы ни было страниц: весь page_range не перебирается.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from range(1, num_pages + 1)
+        return
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор, который листает страницы по ключу сортировки.
+
+    Переход по курсору выполняется одним запросом с условием
+    `WHERE (pub_date, id) < (...)` без OFFSET, поэтому глубокие страницы
+    стоят столько же, сколько первая. Ссылка «Последняя» тоже идёт
+    по курсору: последняя страница читается с конца в обратном порядке.
+
+    Переход по номеру страницы (номера в page_links) по-прежнему работает
+    через OFFSET: глубокие номера стоят пропорционально глубине,
+    а при приблизительном счётчике номер за пределами устаревшего
+    num_pages прижимается к последней известной странице.
+    """
+
+    def __init__(
+        self,
+        object_list,
+        per_page,
+        ordering=('-pub_date', '-pk'),
+        approximate_count=False,
+        count=None,
+        **kwargs,
+    ):
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.key_fields = [name.lstrip('-') for name in ordering]
+        self.descending = ordering[0].startswith('-')
+        self.approximate_count = approximate_count
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        """Общее число объектов.
+
+        Если число передано в конструктор (например, денормализованный
+        счётчик), запрос не выполняется. В приблизительном режиме значение
+        берётся из кэша и обновляется не чаще, чем раз
+        в PAGINATOR_COUNT_TIMEOUT секунд.
+        """
+        if self.known_count is not None:
+            return self.known_count
+        if not self.approximate_count:
+            return self.object_list.count()
+        query = str(self.object_list.query).encode()
+        key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+        return cache.get_or_set(
+            key,
+            self.object_list.count,
+            settings.PAGINATOR_COUNT_TIMEOUT,
+        )
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        return elided_page_range(
+            self.validate_number(number), self.num_pages, on_each_side, on_ends
+        )
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return self._build_page(
+            rows[:self.per_page],
+            number,
+            has_next=len(rows) > self.per_page,
+            has_previous=number > 1,
+        )
+
+    def page_from_cursor(self, cursor):
+        direction, number, values = self.decode_cursor(cursor)
+        if direction == 'last':
+            return self.last_page()
+        forward = direction == 'next'
+        object_list = self.object_list.filter(self._seek(values, forward))
+        if not forward:
+            object_list = object_list.reverse()
+        rows = list(object_list[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return self._build_page(
+                rows, number, has_next=has_more, has_previous=True
+            )
+        rows.reverse()
+        return self._build_page(
+            rows,
+            number if has_more else 1,
+            has_next=True,
+            has_previous=has_more,
+        )
+
+    def first_page(self):
+        """Первая страница без COUNT(*), с курсором на следующую."""
+        rows = list(self.object_list[:self.per_page + 1])
+        return self._build_page(
+            rows[:self.per_page],
+            1,
+            has_next=len(rows) > self.per_page,
+            has_previous=False,
+        )
+
+    def last_page(self):
+        """Последняя страница без OFFSET: строки читаются с конца.
+
+        Размер страницы берётся из остатка count; если счётчик
+        приблизительный и устарел, страница просто окажется короче или
+        длиннее, а курсор на предыдущую продолжит с её первой строки.
+        """
+        number = self.num_pages
+        size = self.count - (number - 1) * self.per_page
+        size = min(max(size, 1), self.per_page)
+        rows = list(self.object_list.reverse()[:size + 1])
+        has_previous = len(rows) > size
+        rows = rows[:size]
+        rows.reverse()
+        return self._build_page(
+            rows,
+            number if has_previous else 1,
+            has_next=False,
+            has_previous=has_previous,
+        )
+
+    def get_page(self, number, cursor=None):
+        """Возвращает страницу по курсору, а если курсора нет
+        или он повреждён — по номеру страницы."""
+        if cursor:
+            try:
+                return self.page_from_cursor(cursor)
+            except InvalidCursor:
+                pass
+        return super().get_page(number)
+
+    def encode_cursor(self, direction, number, row=None):
+        values = []
+        for name in self.key_fields if row is not None else ():
+            if isinstance(row, dict):
+                value = row[name]
+            else:
+                value = getattr(row, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps([direction, number, values]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, number, values = json.loads(raw.decode())
+            if direction not in ('next', 'prev', 'last'):
+                raise ValueError(direction)
+            number = max(int(number), 1)
+            values = [
+                self._key_field(name).to_python(value)
+                for name, value in zip(self.key_fields, values)
+            ]
+        except (
+            binascii.Error,
+            FieldDoesNotExist,
+            TypeError,
+            ValidationError,
+            ValueError,
+        ):
+            raise InvalidCursor('Некорректный курсор')
+        if direction != 'last' and len(values) != len(self.key_fields):
+            raise InvalidCursor('Некорректный курсор')
+        return direction, number, values
+
+    def _key_field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _seek(self, values, forward):
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for index, name in enumerate(self.key_fields):
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_name, prev_value in zip(
+                self.key_fields[:index], values[:index]
+            ):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        page = Page(rows, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        page.last_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor('next', number + 1, rows[-1])
+            page.last_cursor = self.encode_cursor('last', 0)
+        if rows and has_previous:
+            page.previous_cursor = self.encode_cursor(
+                'prev', max(number - 1, 1), rows[0]
+            )
+        return page
+
+
+def connect_paginator(request, object, page_number, **kwargs):
+    paginator = KeysetPaginator(
+        object,
+        page_number,
+        approximate_count=settings.PAGINATOR_APPROXIMATE_COUNT,
+        **kwargs,
+    )
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor')
+    )
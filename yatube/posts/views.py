@@ -1,81 +1,242 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-from yatube.settings import NOTES_NUMBER
+from django.urls import reverse
+from django.views.decorators.http import condition, require_safe
+from PIL import Image
+from core.sqlite import retry_on_lock
+from yatube.settings import COMMENTS_PER_PAGE, NOTES_NUMBER
 
-from .forms import CommentForm, PostForm
+from . import feed, images, resize, search, thumbnails
+from .cache import (
+    GLOBAL_SCOPE,
+    as_datetime,
+    cached_page,
+    http_cache,
+    page_etag,
+    request_page_state,
+    user_etag,
+    versioned_page,
+)
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Follow, Group, Post
-from .utils import connect_paginator
+from .stats import get_stats
+from .utils import KeysetPaginator, connect_paginator
+
+COMMENT_ORDERINGS = {
+    'oldest': ('created', 'pk'),
+    'newest': ('-created', '-pk'),
+}
 
 User = get_user_model()
 
 
-@cache_page(20, key_prefix='index_page')
+@http_cache
+@versioned_page('index')
 def index(request):
-    post_list = Post.objects.all()
-    context = {
-        'page_obj': connect_paginator(request, post_list, NOTES_NUMBER),
-    }
-    return render(request, 'posts/index.html', context)
+    post_list = Post.objects.for_feed()
+    page_obj = connect_paginator(request, post_list, NOTES_NUMBER)
+    thumbnails.prefetch(request, page_obj)
+    return render(request, 'posts/index.html', {'page_obj': page_obj})
 
 
+@http_cache
+@versioned_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
+    posts = Post.objects.filter(group=group).for_feed()
+    page_obj = connect_paginator(request, posts, NOTES_NUMBER)
+    thumbnails.prefetch(request, page_obj)
     context = {
         'group': group,
-        'page_obj': connect_paginator(request, posts, NOTES_NUMBER),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def search_posts(request):
+    form = SearchForm(request.GET or None)
+    posts, next_cursor = [], None
+    if form.is_valid():
+        posts, next_cursor = search.search(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+            cursor=request.GET.get('cursor'),
+        )
+        thumbnails.prefetch(request, posts)
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    context = {
+        'form': form,
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'query': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@http_cache
+@versioned_page('profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = Post.objects.filter(author=author)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-        context = {
-            'author': author,
-            'following': following,
-            'page_obj': connect_paginator(request, author_posts, NOTES_NUMBER),
-        }
-    else:
-        context = {
-            'author': author,
-            'following': False,
-            'page_obj': connect_paginator(request, author_posts, NOTES_NUMBER),
-        }
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    author_posts = Post.objects.filter(author=author).for_feed()
+    page_obj = connect_paginator(request, author_posts, NOTES_NUMBER)
+    thumbnails.prefetch(request, page_obj)
+    context = {
+        'author': author,
+        'stats': get_stats(author),
+        'page_obj': page_obj,
+    }
     return render(request, 'posts/profile.html', context)
 
 
+def comment_page(request, post):
+    """Возвращает порядок и страницу комментариев поста.
+
+    Авторы подгружаются тем же запросом, а число комментариев берётся
+    из счётчика поста, поэтому страница не выполняет COUNT(*).
+    """
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = 'oldest'
+    comments = post.comments.select_related('author').only(
+        'text', 'created', 'post', 'author__username'
+    )
+    paginator = KeysetPaginator(
+        comments,
+        COMMENTS_PER_PAGE,
+        ordering=COMMENT_ORDERINGS[order],
+        count=post.comment_count,
+    )
+    return order, paginator.get_page(1, request.GET.get('cursor'))
+
+
+def detail_post(request, post_id):
+    """Пост для post_detail, один запрос на весь ответ.
+
+    Тот же объект нужен валидаторам условного GET, поэтому он
+    запоминается на время запроса.
+    """
+    posts = request.__dict__.setdefault('_detail_posts', {})
+    if post_id not in posts:
+        posts[post_id] = (
+            Post.objects.for_feed()
+            .select_related('author__stats')
+            .filter(pk=post_id)
+            .first()
+        )
+    return posts[post_id]
+
+
+def post_scopes(post):
+    """Области, от которых зависит страница поста.
+
+    Новый комментарий и новый пост автора меняют область его профиля,
+    переименования — общую, правка самого поста — post.updated.
+    """
+    return (GLOBAL_SCOPE, f'profile:{post.author.username}')
+
+
+def post_state(request, post_id):
+    """Пост, версии его областей и время их изменения."""
+    post = detail_post(request, post_id)
+    if post is None:
+        return None, None, None
+    versions, modified = request_page_state(request, post_scopes(post))
+    return post, versions, modified
+
+
+def post_etag(request, post_id):
+    post, versions, _ = post_state(request, post_id)
+    if post is None:
+        return None
+    etag = page_etag('post_detail', versions, post.updated.timestamp())
+    return user_etag(request, etag)
+
+
+def post_last_modified(request, post_id):
+    post, _, modified = post_state(request, post_id)
+    if post is None:
+        return None
+    return max(post.updated, as_datetime(modified))
+
+
+@http_cache
+@condition(post_etag, post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = Post.objects.filter(author=post.author).count()
+    post = detail_post(request, post_id)
+    if post is None:
+        raise Http404
+    return cached_page(
+        request,
+        'post_detail',
+        post_scopes(post),
+        lambda: render_post_detail(request, post),
+        post.updated.timestamp(),
+    )
+
+
+def render_post_detail(request, post):
+    post_count = get_stats(post.author).post_count
     form = CommentForm(request.POST or None)
+    order, comments = comment_page(request, post)
     context = {
         'post': post,
         'post_count': post_count,
         'form': form,
-        'comments': post.comments.all(),
+        'comments': comments,
+        'comment_order': order,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев в JSON для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('comment_count'), pk=post_id)
+    order, comments = comment_page(request, post)
+    return JsonResponse(
+        {
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'author_url': reverse(
+                        'posts:profile', args=(comment.author.username,)
+                    ),
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'order': order,
+            'next_cursor': comments.next_cursor,
+        }
+    )
+
+
 @login_required
+@retry_on_lock
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
+        if post.image:
+            images.delete_on_rollback(post)
         post.save()
+        transaction.on_commit(lambda: thumbnails.enqueue(post))
         return redirect('posts:profile', post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@retry_on_lock
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -84,7 +245,12 @@ def post_edit(request, post_id):
         request.POST or None, files=request.FILES or None, instance=post
     )
     if form.is_valid():
+        image_changed = 'image' in form.changed_data
+        if image_changed and post.image:
+            images.delete_on_rollback(post)
         form.save()
+        if image_changed:
+            transaction.on_commit(lambda: thumbnails.enqueue(post))
         return redirect('posts:post_detail', post_id)
     return render(
         request,
@@ -94,6 +260,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_lock
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -107,14 +274,19 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = feed.feed_for(request.user).for_feed()
+    page_obj = connect_paginator(
+        request, posts, NOTES_NUMBER, ordering=feed.ORDERING
+    )
+    thumbnails.prefetch(request, page_obj)
     context = {
-        'page_obj': connect_paginator(request, posts, NOTES_NUMBER),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@retry_on_lock
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -123,7 +295,22 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_lock
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
+
+
+@require_safe
+def resized_image(request, width, height, token, path):
+    """Уменьшенная копия картинки из MEDIA_ROOT (см. posts/resize.py)."""
+    if not resize.allowed(width, height) or not resize.allowed_source(path):
+        raise Http404
+    try:
+        if token != resize.source_token(path):
+            return redirect(resize.url(path, width, height))
+        key, filename, content_type = resize.get_variant(path, width, height)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        raise Http404
+    return resize.respond(request, key, filename, content_type)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,8 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -64,7 +67,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,13 +88,108 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 NOTES_NUMBER = 10
+COMMENTS_PER_PAGE = 20
+PAGINATOR_APPROXIMATE_COUNT = True
+PAGINATOR_COUNT_TIMEOUT = 60
+PAGINATOR_ON_EACH_SIDE = 2
+PAGINATOR_ON_ENDS = 1
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_EXPORT_CHUNK_SIZE = 500
+
+FEED_CELEBRITY_THRESHOLD = 1000
+FEED_CELEBRITIES_TIMEOUT = 60
+FEED_BACKFILL_LIMIT = 1000
+# Сколько постов получает каждый подписчик, когда автор перестаёт
+# быть «знаменитостью» (это делается прямо в запросе на отписку).
+FEED_FOLLOWERS_BACKFILL_LIMIT = 20
+FEED_BATCH_SIZE = 500
+
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_THUMBNAIL_WIDTHS = (320, 640, 960)
+POST_THUMBNAIL_SIZES = '(max-width: 992px) 100vw, 960px'
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_JOB_BATCH = 20
+THUMBNAIL_JOB_TIMEOUT = 300
+THUMBNAIL_JOB_ATTEMPTS = 3
+POST_IMAGE_MAX_SIZE = 1920
+POST_IMAGE_QUALITY = 82
+POST_IMAGE_FORMAT = 'WEBP'
+
+# Сколько очков релевантности bm25 даёт посту каждый день новизны.
+SEARCH_RECENCY_WEIGHT = 0.05
+
+METRICS_WINDOW = 300
+SLOW_REQUEST_THRESHOLD = 0.5
+SLOW_REQUEST_MAX_QUERIES = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+# Соединения берутся из пула процесса (см. core/backends/pool.py):
+# не больше POOL['SIZE'] на процесс, ожидание свободного не дольше
+# POOL['TIMEOUT'] секунд. CONN_MAX_AGE ограничивает жизнь соединения
+# в пуле, None — без ограничения. Для PostgreSQL есть такой же
+# core.backends.postgresql.
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 600))
+DATABASE_POOL = {
+    'SIZE': int(os.environ.get('YATUBE_DB_POOL_SIZE', 8)),
+    'TIMEOUT': 10,
+}
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'POOL': DATABASE_POOL,
+    }
+}
+
+# Реплики для чтения: YATUBE_REPLICAS=2 добавляет replica1 и replica2.
+# Локально это файлы SQLite, которые обновляет manage.py replicate.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_REPLICAS', 0)) + 1)
+]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'POOL': DATABASE_POOL,
+        'TEST': {'MIRROR': 'default'},
     }
+    for alias in DATABASE_REPLICAS
+})
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# PRAGMA для каждого нового соединения SQLite (см. core/sqlite.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+READ_YOUR_WRITES_WINDOW = 10
+REPLICATION_INTERVAL = 1
 
 
 # Password validation
@@ -141,8 +239,56 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RESIZE_SIZES = ('96x96', '320x113', '640x226', '960x339')
+RESIZE_CACHE_DIR = 'cache/resize'
+RESIZE_SOURCE_PREFIX = 'posts/'
+RESIZE_CACHE_TTL = 60 * 60 * 24 * 30
+RESIZE_MAX_AGE = 60 * 60 * 24 * 365
+RESIZE_LOCK_TIMEOUT = 30
+RESIZE_LOCK_WAIT = 10
+# None, 'X-Sendfile' или 'X-Accel-Redirect'.
+RESIZE_SENDFILE = None
+RESIZE_ACCEL_PREFIX = '/internal/resize/'
+
+# Кэш общий для всех процессов: бэкенд выбирается переменной окружения
+# YATUBE_CACHE (sqlite, file, memcached или locmem для одного процесса).
+# Тесты по умолчанию работают с locmem, чтобы не писать в кэш на диске.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_CULL_OPTIONS = {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10}
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': CACHE_CULL_OPTIONS,
+    },
+    'file': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': CACHE_CULL_OPTIONS,
+    },
+    # OPTIONS memcached передаются клиенту, MAX_ENTRIES ему не нужен.
+    'memcached': {
+        'BACKEND': 'core.cache.MemcachedCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    },
+    'locmem': {
+        'BACKEND': 'core.cache.LocMemCache',
+        'OPTIONS': CACHE_CULL_OPTIONS,
+    },
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKENDS[
+            os.environ.get('YATUBE_CACHE', 'locmem' if TESTING else 'sqlite')
+        ],
+        'KEY_PREFIX': 'yatube',
+        'VERSION': 1,
+        'TIMEOUT': 300,
     }
 }
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2
+# Сколько секунд прокси может отдавать анонимам страницу без проверки.
+ANONYMOUS_PAGE_MAX_AGE = 60